@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the FFmpeg progress Parser.
+
+Feeds recorded FFmpeg logs (one stderr/stdout line per line) through Parser.parse_progress and reports lines/sec.
+When no log files are given, a synthetic log of typical stats lines is used.
+
+To compare against an older version of the plugin, point --plugin-source at the 'source' directory of another
+checkout (for example one created with 'git worktree add').
+
+    python scripts/benchmark_parser.py ffmpeg.log
+    python scripts/benchmark_parser.py --plugin-source /tmp/old/source ffmpeg.log
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Set the path to the project root directory
+scripts_directory = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(scripts_directory, '..'))
+
+
+def synthetic_log(line_count):
+    lines = [
+        "Input #0, matroska,webm, from 'input.mkv':",
+        "  Duration: 00:42:10.03, start: 0.000000, bitrate: 6022 kb/s",
+        "Press [q] to stop, [?] for help",
+    ]
+    fps = 23.976
+    for i in range(line_count):
+        frame = (i + 1) * 60659 // line_count
+        centiseconds = int(frame * 100 / fps)
+        lines.append(
+            "frame={:5d} fps= 96 q=28.0 size={:8d}kB time={:02d}:{:02d}:{:02d}.{:02d} bitrate=2523.1kbits/s speed=4.01x".format(
+                frame, frame * 12, centiseconds // 360000, centiseconds // 6000 % 60, centiseconds // 100 % 60,
+                centiseconds % 100
+            )
+        )
+    return lines
+
+
+def read_logs(paths):
+    lines = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            # FFmpeg separates stats updates with carriage returns
+            for line in f.read().replace('\r', '\n').split('\n'):
+                if line:
+                    lines.append(line)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Parser.parse_progress over recorded FFmpeg logs.')
+    parser.add_argument('logs', nargs='*', help='Recorded FFmpeg log files')
+    parser.add_argument('--plugin-source', default=os.path.join(project_root, 'source'),
+                        help="Directory containing the 'fabiorzfreitas_preset' plugin (default: this checkout)")
+    parser.add_argument('--lines', type=int, default=20000, help='Number of synthetic lines when no logs are given')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs (best run is reported)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.realpath(args.plugin_source))
+    from fabiorzfreitas_preset.lib.ffmpeg import Parser
+
+    lines = read_logs(args.logs) if args.logs else synthetic_log(args.lines)
+    logger = logging.getLogger('benchmark')
+
+    best = None
+    for _ in range(max(1, args.repeat)):
+        progress_parser = Parser(logger)
+        progress_parser.duration = 2530.03
+        progress_parser.total_frames = 60659
+        start = time.perf_counter()
+        for line in lines:
+            progress_parser.parse_progress(line)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    print('{} lines, best of {}: {:.4f}s, {:,.0f} lines/sec, final percent {}'.format(
+        len(lines), args.repeat, best, len(lines) / best, progress_parser.percent))
+
+
+if __name__ == '__main__':
+    main()
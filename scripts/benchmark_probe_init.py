@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for Probe construction and the MIME type test.
+
+Creates a Probe and runs test_valid_mimetype() for each path in a synthetic list of library paths (100k by default),
+the way the file test does for every file, and reports the cost per file. FFprobe must be on the PATH, as Probe
+checks for it. No file is probed.
+
+To compare against an older version of the plugin, point --plugin-source at the 'source' directory of another
+checkout (for example one created with 'git worktree add').
+
+    python scripts/benchmark_probe_init.py
+    python scripts/benchmark_probe_init.py --plugin-source /tmp/old/source
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Set the path to the project root directory
+scripts_directory = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(scripts_directory, '..'))
+
+extensions = ['.mkv', '.mp4', '.avi', '.MKV', '.m4v', '.ts', '.srt', '.nfo', '.jpg', '.flac']
+
+
+def synthetic_paths(path_count):
+    return [
+        '/library/Show {}/Season {}/Episode {}{}'.format(i // 1000, i // 100 % 10, i % 100, extensions[i % len(extensions)])
+        for i in range(path_count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Probe construction over a list of paths.')
+    parser.add_argument('--plugin-source', default=os.path.join(project_root, 'source'),
+                        help="Directory containing the 'fabiorzfreitas_preset' plugin (default: this checkout)")
+    parser.add_argument('--paths', type=int, default=100000, help='Number of synthetic paths')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.realpath(args.plugin_source))
+    from fabiorzfreitas_preset.lib.ffmpeg import Probe
+
+    logger = logging.getLogger('benchmark')
+    paths = synthetic_paths(args.paths)
+
+    valid = 0
+    start = time.perf_counter()
+    for path in paths:
+        probe = Probe(logger, allowed_mimetypes=['video'])
+        if probe.test_valid_mimetype(path):
+            valid += 1
+    elapsed = time.perf_counter() - start
+
+    print('{} paths ({} video): {:.2f}s, {:.1f} us per file'.format(len(paths), valid, elapsed,
+                                                                   elapsed / len(paths) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
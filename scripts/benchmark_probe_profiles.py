@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the 'full' and 'lean' ffprobe profiles.
+
+Probes each file with both profiles and reports the ffprobe output size, the JSON parse time and the ffprobe run time
+for each of them, then the totals and what the lean profile saves. Directories are searched for files. Each file is
+probed --repeat times with each profile and the best times are reported. FFprobe must be on the PATH.
+
+To compare against an older version of the plugin, point --plugin-source at the 'source' directory of another
+checkout (for example one created with 'git worktree add').
+
+    python scripts/benchmark_probe_profiles.py /path/to/library/Show
+    python scripts/benchmark_probe_profiles.py --repeat 10 movie.mkv series.mkv
+"""
+import argparse
+import os
+import sys
+import time
+
+# Set the path to the project root directory
+scripts_directory = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(scripts_directory, '..'))
+
+profiles = ['full', 'lean']
+
+
+def find_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def probe_file(ffprobe_file, file_path, profile, repeat):
+    output_bytes = 0
+    parse_seconds = None
+    probe_seconds = None
+    for _ in range(max(1, repeat)):
+        stats = {}
+        start = time.perf_counter()
+        ffprobe_file(file_path, profile=profile, stats=stats)
+        elapsed = time.perf_counter() - start
+        output_bytes = stats['output_bytes']
+        parse_seconds = min(stats['parse_seconds'], parse_seconds if parse_seconds is not None else float('inf'))
+        probe_seconds = min(elapsed, probe_seconds if probe_seconds is not None else float('inf'))
+    return {'output_bytes': output_bytes, 'parse_seconds': parse_seconds, 'probe_seconds': probe_seconds}
+
+
+def saved(full, lean):
+    if not full:
+        return '-'
+    return '{:.1f}%'.format((full - lean) / full * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the output size and parse time of the ffprobe profiles.")
+    parser.add_argument('paths', nargs='+', help='Files, or directories searched for files, to probe')
+    parser.add_argument('--plugin-source', default=os.path.join(project_root, 'source'),
+                        help="Directory containing the 'fabiorzfreitas_preset' plugin (default: this checkout)")
+    parser.add_argument('--repeat', type=int, default=3, help='Number of probes of each file per profile (default: 3)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.realpath(args.plugin_source))
+    from fabiorzfreitas_preset.lib.ffmpeg.probe import FFProbeError, ffprobe_file
+
+    totals = {profile: {'output_bytes': 0, 'parse_seconds': 0.0, 'probe_seconds': 0.0} for profile in profiles}
+    probed = 0
+    for file_path in find_files(args.paths):
+        try:
+            results = {profile: probe_file(ffprobe_file, file_path, profile, args.repeat) for profile in profiles}
+        except FFProbeError:
+            print('{}: unable to be probed, skipped'.format(file_path))
+            continue
+        probed += 1
+        for profile in profiles:
+            for key, value in results[profile].items():
+                totals[profile][key] += value
+        print('{}: {}'.format(file_path, ', '.join(
+            '{} {} bytes, parsed in {:.3f} ms'.format(profile, results[profile]['output_bytes'],
+                                                      results[profile]['parse_seconds'] * 1000)
+            for profile in profiles)))
+
+    if not probed:
+        print('No file could be probed')
+        return 1
+
+    print()
+    print('{} files probed, best of {} runs'.format(probed, max(1, args.repeat)))
+    print('{:<8}{:>16}{:>16}{:>16}'.format('profile', 'output bytes', 'parse ms', 'ffprobe ms'))
+    for profile in profiles:
+        print('{:<8}{:>16}{:>16.3f}{:>16.1f}'.format(profile, totals[profile]['output_bytes'],
+                                                     totals[profile]['parse_seconds'] * 1000,
+                                                     totals[profile]['probe_seconds'] * 1000))
+    full, lean = totals['full'], totals['lean']
+    print('{:<8}{:>16}{:>16}{:>16}'.format('saved', saved(full['output_bytes'], lean['output_bytes']),
+                                           saved(full['parse_seconds'], lean['parse_seconds']),
+                                           saved(full['probe_seconds'], lean['probe_seconds'])))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
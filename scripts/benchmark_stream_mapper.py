@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for StreamMapper stream mapping.
+
+Maps synthetic probes with 1, 2, 50 and 500 streams (one video, a few audio and subtitle streams, the rest
+attachments, as in MKVs that carry their fonts) and reports mappings/sec. The 1 and 2 stream probes (video only and
+video + audio) are the typical library file. Each size is timed --repeat times and the best run is reported. FFmpeg must be on the PATH, as StreamMapper checks for it.
+
+To compare against an older version of the plugin, point --plugin-source at the 'source' directory of another
+checkout (for example one created with 'git worktree add').
+
+    python scripts/benchmark_stream_mapper.py
+    python scripts/benchmark_stream_mapper.py --plugin-source /tmp/old/source
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Set the path to the project root directory
+scripts_directory = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(scripts_directory, '..'))
+
+
+def synthetic_probe(stream_count):
+    streams = []
+    for index in range(stream_count):
+        if index == 0:
+            codec_type, codec_name = 'video', 'h264'
+        elif index < 4:
+            codec_type, codec_name = 'audio', 'aac'
+        elif index < 8:
+            codec_type, codec_name = 'subtitle', 'ass'
+        else:
+            codec_type, codec_name = 'attachment', 'ttf'
+        streams.append({'index': index, 'codec_type': codec_type, 'codec_name': codec_name})
+    return {'streams': streams}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark StreamMapper stream mapping over synthetic probes.')
+    parser.add_argument('--plugin-source', default=os.path.join(project_root, 'source'),
+                        help="Directory containing the 'fabiorzfreitas_preset' plugin (default: this checkout)")
+    parser.add_argument('--seconds', type=float, default=1.0, help='Time spent on each run')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs for each probe size (default: 5)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.realpath(args.plugin_source))
+    from fabiorzfreitas_preset.lib.ffmpeg import StreamMapper
+
+    class BenchmarkStreamMapper(StreamMapper):
+        def __init__(self):
+            super(BenchmarkStreamMapper, self).__init__(logging.getLogger('benchmark'), ['audio'])
+
+        def test_stream_needs_processing(self, stream_info):
+            return stream_info.get('codec_name') != 'ac3'
+
+        def custom_stream_mapping(self, stream_info, stream_id):
+            return {
+                'stream_mapping':  ['-map', '0:a:{}'.format(stream_id)],
+                'stream_encoding': ['-c:a:{}'.format(stream_id), 'ac3'],
+            }
+
+    for stream_count in (1, 2, 50, 500):
+        probe = synthetic_probe(stream_count)
+        mapper = BenchmarkStreamMapper()
+        mapper.set_probe(probe)
+        best_rate = 0
+        for _ in range(max(1, args.repeat)):
+            iterations = 0
+            start = time.perf_counter()
+            deadline = start + args.seconds / max(1, args.repeat)
+            while time.perf_counter() < deadline:
+                for _ in range(100):
+                    mapper.streams_need_processing()
+                iterations += 100
+            best_rate = max(best_rate, iterations / (time.perf_counter() - start))
+        print('{:4d} streams: {:,.0f} mappings/sec, {} args'.format(
+            stream_count, best_rate, len(mapper.get_stream_mapping()) + len(mapper.get_stream_encoding())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Thread-safety check for StreamMapper.
+
+Builds FFmpeg commands from a thread pool, one StreamMapper per command, and compares each of them with the command
+built for the same job on a single thread. Every job has its own probe, input and output file and FFmpeg options,
+so any state shared between mappers shows up as a mismatch. FFmpeg must be on the PATH, as StreamMapper checks for it.
+Exits with status 1 if any command differs.
+
+To check an older version of the plugin, point --plugin-source at the 'source' directory of another checkout
+(for example one created with 'git worktree add').
+
+    python scripts/check_stream_mapper_threads.py
+    python scripts/check_stream_mapper_threads.py --commands 20000 --threads 32
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Set the path to the project root directory
+scripts_directory = os.path.dirname(os.path.realpath(__file__))
+project_root = os.path.realpath(os.path.join(scripts_directory, '..'))
+
+
+def synthetic_job(job_id):
+    rng = random.Random(job_id)
+    streams = [{'index': 0, 'codec_type': 'video', 'codec_name': rng.choice(['h264', 'hevc'])}]
+    for index in range(1, rng.randint(1, 12)):
+        codec_type = rng.choice(['audio', 'audio', 'subtitle', 'attachment'])
+        codec_name = {'audio': rng.choice(['aac', 'ac3']), 'subtitle': 'ass', 'attachment': 'ttf'}[codec_type]
+        streams.append({'index': index, 'codec_type': codec_type, 'codec_name': codec_name})
+    return {
+        'probe':       {'streams': streams},
+        'input_file':  '/library/job_{}/input.mkv'.format(job_id),
+        'output_file': '/cache/job_{}/output.mkv'.format(job_id),
+        'generic':     ['-threads', str(job_id % 8)],
+        'main':        {'-ss': str(job_id % 60)},
+        'advanced':    ['-metadata', 'title=job {}'.format(job_id)],
+        'progress_pipe': job_id % 2 == 0,
+        'null_output': job_id % 5 == 0,
+    }
+
+
+def build_command(mapper_class, job):
+    mapper = mapper_class()
+    mapper.set_probe(job['probe'])
+    mapper.set_input_file(job['input_file'])
+    if job['null_output']:
+        mapper.set_output_null()
+    else:
+        mapper.set_output_file(job['output_file'])
+    mapper.set_progress_pipe(job['progress_pipe'])
+    mapper.set_ffmpeg_generic_options(*job['generic'])
+    mapper.set_ffmpeg_main_options(**job['main'])
+    mapper.set_ffmpeg_advanced_options(*job['advanced'])
+    mapper.streams_need_processing()
+    return mapper.get_ffmpeg_args()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that StreamMapper builds correct commands from many threads.')
+    parser.add_argument('--plugin-source', default=os.path.join(project_root, 'source'),
+                        help="Directory containing the 'fabiorzfreitas_preset' plugin (default: this checkout)")
+    parser.add_argument('--commands', type=int, default=5000, help='Number of commands to build (default: 5000)')
+    parser.add_argument('--threads', type=int, default=16, help='Number of threads in the pool (default: 16)')
+    parser.add_argument('--switch-interval', type=float, default=0.000001,
+                        help='Thread switch interval in seconds, a short one interleaves the threads more often')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.realpath(args.plugin_source))
+    from fabiorzfreitas_preset.lib.ffmpeg import StreamMapper
+
+    class CheckStreamMapper(StreamMapper):
+        def __init__(self):
+            super(CheckStreamMapper, self).__init__(logging.getLogger('check'), ['video', 'audio'])
+
+        def test_stream_needs_processing(self, stream_info):
+            return stream_info.get('codec_name') not in ('h264', 'ac3')
+
+        def custom_stream_mapping(self, stream_info, stream_id):
+            ident = 'v' if stream_info.get('codec_type') == 'video' else 'a'
+            encoder = 'libx264' if ident == 'v' else 'ac3'
+            return {
+                'stream_mapping':  ['-map', '0:{}:{}'.format(ident, stream_id)],
+                'stream_encoding': ['-c:{}:{}'.format(ident, stream_id), encoder],
+            }
+
+    jobs = [synthetic_job(job_id) for job_id in range(args.commands)]
+    expected = [build_command(CheckStreamMapper, job) for job in jobs]
+
+    sys.setswitchinterval(args.switch_interval)
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(lambda job: build_command(CheckStreamMapper, job), jobs))
+
+    mismatches = [job_id for job_id, (result, command) in enumerate(zip(results, expected)) if result != command]
+    for job_id in mismatches[:5]:
+        print('Command {} differs:\n  expected: {}\n  built:    {}'.format(
+            job_id, ' '.join(expected[job_id]), ' '.join(results[job_id])))
+    print('{} of {} commands built from {} threads match their expected argv'.format(
+        len(results) - len(mismatches), len(results), args.threads))
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
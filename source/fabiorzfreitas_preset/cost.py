@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.cost.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 18:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import math
+
+from fabiorzfreitas_preset import encoder, rules
+from fabiorzfreitas_preset.lib.ffmpeg import Probe, tools
+
+# Task ordering
+# 'shortest_first' drains the cheap jobs first, so the most files are completed per hour
+priority_orders: dict = {
+    'shortest_first': 'Shortest job first (remuxes before transcodes)',
+    'longest_first':  'Longest job first',
+    'none':           'Unchanged (queue order)',
+}
+
+# Reference throughputs used to estimate the work of a task, in seconds
+# Every task reads the source file and writes the output file
+copy_bytes_per_second: int = 200 * 1000 * 1000
+# libx264 'medium' encoding 1080p at 60 frames per second
+x264_pixels_per_second: int = 1920 * 1080 * 60
+ac3_encode_speed: int = 200
+task_overhead_seconds: int = 5
+
+# Defaults for files without a duration, resolution or frame rate in the probe
+default_duration: int = 45 * 60
+default_resolution: tuple = (1920, 1080)
+default_frame_rate: float = 24
+
+# Tasks that cost more than this all get the lowest (or highest) priority score
+max_cost_seconds: int = 48 * 60 * 60
+max_priority_score: int = 100
+
+
+def get_frame_rate(avg_frame_rate: str) -> float:
+    """
+    Returns the frame rate from an ffprobe 'avg_frame_rate' fraction, e.g. '24000/1001'
+    """
+
+    try:
+        numerator, _, denominator = str(avg_frame_rate).partition('/')
+        frame_rate: float = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return default_frame_rate
+
+    return frame_rate if frame_rate > 0 else default_frame_rate
+
+
+def estimate_cost(probe: Probe, decision: rules.Decision, single_pass: bool = True,
+                  encoder_profile: str = 'balanced') -> float:
+    """
+    Returns the estimated work of processing the file with the given decision, in seconds on a reference machine.
+    Only the relative costs of tasks matter, they are used to order the task queue.
+    """
+
+    probe_result = probe.get_result()
+
+    # The duration and size are derived from each other with the bitrate when one of them is missing
+    duration: float = probe_result.duration or 0
+    size: int = probe_result.size or 0
+    if not duration and size and probe_result.bit_rate:
+        duration = size * 8 / probe_result.bit_rate
+    if not size and duration and probe_result.bit_rate:
+        size = int(duration * probe_result.bit_rate / 8)
+    if not duration:
+        duration = default_duration
+
+    cost: float = task_overhead_seconds + 2 * size / copy_bytes_per_second
+    if decision.is_remux_only(single_pass):
+        return cost
+
+    if decision.has_fired('first_audio_is_not_ac3'):
+        cost += duration / ac3_encode_speed
+
+    if decision.has_fired('non_h264'):
+        width, height, _ = tools.get_video_stream_resolution(probe.get_probe().get('streams', []))
+        if not width or not height:
+            width, height = default_resolution
+        first_video = probe_result.first_video
+        frame_rate: float = get_frame_rate(first_video.avg_frame_rate if first_video else None)
+        profile: dict = encoder.encoder_profiles.get(encoder_profile, encoder.encoder_profiles['balanced'])
+        cost += duration * frame_rate * width * height / x264_pixels_per_second * profile['relative_cost']
+
+    return cost
+
+
+def get_priority_score(cost: float, priority_order: str) -> int:
+    """
+    Returns the priority score of a task from its estimated cost.
+    Costs are compared on a log scale, so a remux and a film transcode are far apart but two similar episodes are not.
+    """
+
+    if priority_order not in ('shortest_first', 'longest_first'):
+        return 0
+
+    scale: float = min(1.0, math.log1p(max(0.0, cost)) / math.log1p(max_cost_seconds))
+    if priority_order == 'shortest_first':
+        scale = 1 - scale
+
+    return int(round(max_priority_score * scale))
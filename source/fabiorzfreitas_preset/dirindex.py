@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.dirindex.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 21:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class DirectoryIndex(object):
+    """
+    Index of the file test verdicts of each library directory, stored in a SQLite database.
+
+    Each directory entry holds the directory's modification time (ns) and its number of children. Each file tested in
+    it has a row with its verdict, size and modification time. Adding, removing or renaming a file changes the
+    directory's modification time, which drops the whole entry. A verdict is also ignored when its file has changed.
+    Entries are kept in memory for the most recently used directories, so a directory is only read from the
+    database and listed once while its files are tested.
+
+    The index is opened with a fingerprint of the logic that decides the verdicts. When it differs from the one the
+    index was written with, e.g. after a plugin update, every entry is dropped.
+    """
+
+    # Number of directory entries kept in memory
+    max_memory_entries = 256
+
+    # Version of the database tables. Older tables are dropped, the index is rebuilt by the next library scan.
+    schema_version = 2
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str, fingerprint: str = ''):
+        self.db_path = os.path.abspath(db_path)
+
+        db_dir = os.path.dirname(self.db_path)
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        # A single connection is shared between threads. All access is serialised with a lock.
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.fingerprint = None
+        self.__init_schema()
+        self.set_fingerprint(fingerprint)
+
+    @classmethod
+    def open(cls, db_path: str, fingerprint: str = ''):
+        """
+        Returns a shared DirectoryIndex for the given database path, holding verdicts for the given fingerprint
+        """
+
+        db_path = os.path.abspath(db_path)
+        with cls._instances_lock:
+            index = cls._instances.get(db_path)
+            if index is None:
+                index = cls(db_path, fingerprint)
+                cls._instances[db_path] = index
+        if index.fingerprint != fingerprint:
+            index.set_fingerprint(fingerprint)
+        return index
+
+    def __init_schema(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            if self._conn.execute('PRAGMA user_version').fetchone()[0] != self.schema_version:
+                self._conn.execute('DROP TABLE IF EXISTS directories')
+                self._conn.execute('DROP TABLE IF EXISTS files')
+                self._conn.execute('PRAGMA user_version = {}'.format(int(self.schema_version)))
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                '  key TEXT PRIMARY KEY,'
+                '  value TEXT NOT NULL'
+                ')'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS directories ('
+                '  path TEXT PRIMARY KEY,'
+                '  mtime_ns INTEGER NOT NULL,'
+                '  child_count INTEGER NOT NULL,'
+                '  last_update REAL NOT NULL'
+                ')'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                '  directory TEXT NOT NULL,'
+                '  name TEXT NOT NULL,'
+                '  verdict TEXT NOT NULL,'
+                '  size INTEGER NOT NULL,'
+                '  mtime_ns INTEGER NOT NULL,'
+                '  PRIMARY KEY (directory, name)'
+                ')'
+            )
+            self._conn.commit()
+
+    def set_fingerprint(self, fingerprint: str):
+        """
+        Sets the fingerprint of the logic that decides the verdicts, dropping every entry if it has changed
+        """
+
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                self._entries.clear()
+                self._conn.execute('DELETE FROM directories')
+                self._conn.execute('DELETE FROM files')
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+                self._conn.commit()
+            self.fingerprint = fingerprint
+
+    @staticmethod
+    def directory_key(directory: str):
+        """
+        Returns the modification time (ns) used to validate the entry of a directory, or None if it can't be read.
+        It should be read before a file is tested, so that changes made during the test are not recorded.
+        """
+
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def file_key(file_path: str):
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    @staticmethod
+    def count_children(directory: str):
+        try:
+            with os.scandir(directory) as entries:
+                return sum(1 for _ in entries)
+        except OSError:
+            return None
+
+    def __get_entry(self, directory: str, directory_key: int):
+        """
+        Returns the entry of a directory if it's still valid for the given directory key.
+        Must be called with the lock held.
+        """
+
+        entry = self._entries.get(directory)
+        if entry is not None:
+            if entry['mtime_ns'] == directory_key:
+                self._entries.move_to_end(directory)
+                return entry
+            del self._entries[directory]
+
+        row = self._conn.execute(
+            'SELECT mtime_ns, child_count FROM directories WHERE path = ?', (directory,)
+        ).fetchone()
+        if row is None or row[0] != directory_key or row[1] != self.count_children(directory):
+            return None
+
+        verdicts = {
+            name: (verdict, size, mtime_ns) for name, verdict, size, mtime_ns in self._conn.execute(
+                'SELECT name, verdict, size, mtime_ns FROM files WHERE directory = ?', (directory,)
+            )
+        }
+        entry = {'mtime_ns': row[0], 'child_count': row[1], 'verdicts': verdicts}
+        self.__remember(directory, entry)
+        return entry
+
+    def __remember(self, directory: str, entry: dict):
+        self._entries[directory] = entry
+        self._entries.move_to_end(directory)
+        while len(self._entries) > self.max_memory_entries:
+            self._entries.popitem(last=False)
+
+    def get_verdict(self, file_path: str, directory_key: int = None):
+        """
+        Returns the recorded verdict of a file, or None if the file or its directory changed since it was recorded
+        """
+
+        directory, basename = os.path.split(os.path.abspath(file_path))
+        if directory_key is None:
+            directory_key = self.directory_key(directory)
+            if directory_key is None:
+                return None
+
+        with self._lock:
+            entry = self.__get_entry(directory, directory_key)
+            if entry is None:
+                return None
+            verdict = entry['verdicts'].get(basename)
+        if verdict is None:
+            return None
+
+        # The file may have been rewritten in place, which doesn't change the directory
+        if self.file_key(file_path) != verdict[1:]:
+            return None
+
+        return verdict[0]
+
+    def set_verdict(self, file_path: str, verdict: str, directory_key: int):
+        """
+        Records the verdict of a file.
+        The directory key should be read before the file was tested. Nothing is recorded if the directory has
+        changed since then.
+        """
+
+        directory, basename = os.path.split(os.path.abspath(file_path))
+        file_key = self.file_key(file_path)
+        if directory_key is None or file_key is None or self.directory_key(directory) != directory_key:
+            return
+
+        with self._lock:
+            entry = self.__get_entry(directory, directory_key)
+            if entry is None:
+                child_count = self.count_children(directory)
+                if child_count is None:
+                    return
+                # The directory is new or has changed, its previous verdicts are dropped
+                entry = {'mtime_ns': directory_key, 'child_count': child_count, 'verdicts': {}}
+                self._conn.execute('DELETE FROM files WHERE directory = ?', (directory,))
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO directories (path, mtime_ns, child_count, last_update) VALUES (?, ?, ?, ?)',
+                    (directory, directory_key, child_count, time.time())
+                )
+            entry['verdicts'][basename] = (verdict,) + file_key
+            self.__remember(directory, entry)
+
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files (directory, name, verdict, size, mtime_ns) VALUES (?, ?, ?, ?, ?)',
+                (directory, basename, verdict) + file_key
+            )
+            self._conn.commit()
+
+    def get_summary(self, directory: str):
+        """
+        Returns the number of files recorded with each verdict in a directory, or None if its entry is not valid
+        """
+
+        directory = os.path.abspath(directory)
+        directory_key = self.directory_key(directory)
+        if directory_key is None:
+            return None
+
+        with self._lock:
+            entry = self.__get_entry(directory, directory_key)
+            if entry is None:
+                return None
+            summary = {}
+            for verdict in entry['verdicts'].values():
+                summary[verdict[0]] = summary.get(verdict[0], 0) + 1
+        return summary
+
+    def invalidate_subtree(self, path: str):
+        """
+        Removes the entries of a directory and of every directory below it
+        """
+
+        path = os.path.abspath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for directory in [d for d in self._entries if d == path or d.startswith(prefix)]:
+                del self._entries[directory]
+            self._conn.execute(
+                'DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?', (path, len(prefix), prefix)
+            )
+            self._conn.execute(
+                'DELETE FROM files WHERE directory = ? OR substr(directory, 1, ?) = ?', (path, len(prefix), prefix)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Removes all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._conn.execute('DELETE FROM directories')
+            self._conn.execute('DELETE FROM files')
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM directories').fetchone()[0]
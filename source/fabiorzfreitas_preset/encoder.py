@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.encoder.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 14:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import os
+
+# x264 encoder profiles
+# 'balanced' matches the libx264 defaults, 'throughput' favours encoding speed when many files are queued
+# and 'size' spends more time per frame for smaller output files at the same quality
+# 'relative_cost' is the encoding time per frame compared to the 'balanced' profile
+encoder_profiles: dict = {
+    'balanced':   {
+        'label':         'Balanced',
+        'preset':        'medium',
+        'crf':           23,
+        'relative_cost': 1.0,
+        'x264_params':   [],
+    },
+    'throughput': {
+        'label':         'Throughput (faster encodes, larger files)',
+        'preset':        'veryfast',
+        'crf':           23,
+        'relative_cost': 0.4,
+        'x264_params':   ['rc-lookahead=20'],
+    },
+    'size':       {
+        'label':         'Size (slower encodes, smaller files)',
+        'preset':        'slow',
+        'crf':           23,
+        'relative_cost': 1.6,
+        'x264_params':   [],
+    },
+}
+
+
+def get_available_cpu_count() -> int:
+    """
+    Returns the number of CPUs this process is allowed to run on
+    """
+
+    # The affinity mask respects CPU pinning (taskset, container cpusets), os.cpu_count() doesn't
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+def get_thread_budget(worker_count: int, cpu_count: int = None) -> int:
+    """
+    Returns the number of threads each worker's encoder may use, so that concurrent workers share the CPUs
+    instead of each one starting a thread per CPU
+    """
+
+    if cpu_count is None:
+        cpu_count = get_available_cpu_count()
+
+    return max(1, cpu_count // max(1, int(worker_count)))
+
+
+def get_x264_args(profile_name: str, worker_count: int, cpu_count: int = None) -> list:
+    """
+    Returns the libx264 output options for the given encoder profile and number of concurrent workers
+    """
+
+    profile: dict = encoder_profiles.get(profile_name, encoder_profiles['balanced'])
+    threads: int = get_thread_budget(worker_count, cpu_count=cpu_count)
+
+    # x264 runs its lookahead on separate threads, sized from the thread count unless given
+    x264_params: list = [f'threads={threads}', f'lookahead-threads={max(1, threads // 6)}'] + profile['x264_params']
+
+    return ['-threads', f'{threads}', '-preset', profile['preset'], '-crf', f"{profile['crf']}",
+            '-x264-params', ':'.join(x264_params)]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.eventlog.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 20:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import json
+import logging
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+# Output formats of the plugin's log events
+log_formats: dict = {
+    'text':       'Text',
+    'json_lines': 'JSON lines (one JSON object per event)',
+}
+
+# Event name: (level, text message)
+# The text message is formatted from the event fields, sequences are joined with spaces
+events: dict = {
+    'prefetch_done':       (logging.DEBUG, '[TESTING] Prefetched {probed_count} of {file_count} probes in {directory}'),
+    'prefetch_failed':     (logging.DEBUG, '[TESTING] Unable to prefetch probes in {directory}'),
+    'test_started':        (logging.DEBUG, '[TESTING] Testing file {path}'),
+    'test_indexed':        (logging.DEBUG, "[TESTING] File {path} and its directory haven't changed since it was "
+                                           "skipped, skipping"),
+    'test_prefiltered':    (logging.DEBUG, '[TESTING] File {path} {reason}, skipping'),
+    'prefilter_counters':  (logging.DEBUG, '[TESTING] Pre-filter counters: {counters}'),
+    'test_skipped':        (logging.DEBUG, "[TESTING] File {path} doesn't need processing, skipping"),
+    'test_queued':         (logging.DEBUG, '[TESTING] File {path} fired {rules}, adding to queue'),
+    'test_priority':       (logging.DEBUG, '[TESTING] File {path} estimated to take {cost:.0f}s of work, '
+                                           'priority score {priority_score}'),
+    'process_started':     (logging.DEBUG, '[PROCESSING] Processing file {path}'),
+    'process_skipped':     (logging.DEBUG, "[PROCESSING] File {path} doesn't need processing"),
+    'scratch_full':        (logging.DEBUG, '[PROCESSING] Scratch directory {directory} has less than {expected_size} '
+                                           'bytes free, writing next to {path}'),
+    'scratch_unavailable': (logging.WARNING, '[PROCESSING] Unable to use scratch directory {directory}: {error}, '
+                                           'writing next to {path}'),
+    'process_rules':       (logging.DEBUG, '[PROCESSING] File {path} fired {rules}, processing'),
+    'process_remux_only':  (logging.DEBUG, '[PROCESSING] File {path} will only be remuxed, the remaining changes need '
+                                           'a second pass'),
+    'process_encoder':     (logging.DEBUG, '[PROCESSING] Encoding {path} with {encoder_args}'),
+    'process_segments':    (logging.DEBUG, '[PROCESSING] Encoding {path} in up to {segment_count} segments'),
+    'postprocess_started': (logging.DEBUG, '[POST-PROCESSING] Post-processing file {path}'),
+    'postprocess_moved':   (logging.DEBUG, '[POST-PROCESSING] Moved {file_in} to {file_out} ({method})'),
+    'postprocess_failed':  (logging.ERROR, '[POST-PROCESSING] Unable to move {file_in} to {file_out}: {error}'),
+    'postprocess_remux':   (logging.DEBUG, '[POST-PROCESSING] File {path} container is now .mkv, moving'),
+    'postprocess_x264':    (logging.DEBUG, '[POST-PROCESSING] File {path} video stream is not x264, setting '
+                                           'different output'),
+}
+
+log_settings: dict = {
+    'json_lines': False,
+}
+
+
+def configure(log_format: str) -> None:
+    """
+    Sets the output format of the log events
+    """
+
+    log_settings['json_lines'] = log_format == 'json_lines'
+
+
+def is_enabled(event: str) -> bool:
+    """
+    Returns True if the event would be logged, so callers can skip building expensive fields
+    """
+
+    return logger.isEnabledFor(events[event][0])
+
+
+def log_event(event: str, **fields) -> None:
+    """
+    Logs an event with its fields.
+    Nothing is formatted unless the logger is enabled for the level of the event.
+    """
+
+    level, message = events[event]
+    if not logger.isEnabledFor(level):
+        return
+
+    if log_settings['json_lines']:
+        logger.log(level, json.dumps(dict(event=event, **fields), default=str, separators=(',', ':')))
+        return
+
+    text_fields: dict = {}
+    for name, value in fields.items():
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        text_fields[name] = value
+    logger.log(level, message.format(**text_fields))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.fileops.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 15:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+from fabiorzfreitas_preset import rules
+from fabiorzfreitas_preset.lib.ffmpeg import ProbeResult
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+# Extra free space required on top of the expected output size
+free_space_margin: float = 1.1
+
+# HEVC and other modern codecs usually need about twice the bitrate when encoded to x264 at the same quality
+transcode_size_factor: float = 2.0
+
+# Bitrate of the ac3 stream added when the first audio stream is not ac3 (FFmpeg's default for 5.1)
+ac3_bit_rate: int = 448000
+
+# Chunk size used when copying a file to another filesystem
+copy_buffer_size: int = 8 * 1024 * 1024
+
+# ioctl request to clone a file's extents (_IOW(0x94, 9, int) from linux/fs.h)
+FICLONE: int = 0x40049409
+
+
+def get_source_size(probe_result: ProbeResult) -> int:
+    """
+    Returns the size in bytes of the probed file, estimated from its bitrate if the probe has no size
+    """
+
+    source_size: int = probe_result.size or 0
+    if not source_size and probe_result.bit_rate and probe_result.duration:
+        source_size = int(probe_result.bit_rate * probe_result.duration / 8)
+
+    return source_size
+
+
+def get_expected_output_size(probe_result: ProbeResult, decision: rules.Decision) -> int:
+    """
+    Returns the expected size in bytes of the file FFmpeg will write for this decision, from the probe's size or bitrate
+    """
+
+    expected_size: int = get_source_size(probe_result)
+    if decision.has_fired('non_h264'):
+        expected_size = int(expected_size * transcode_size_factor)
+
+    if decision.has_fired('first_audio_is_not_ac3') and probe_result.duration:
+        expected_size += int(ac3_bit_rate * probe_result.duration / 8)
+
+    return expected_size
+
+
+def get_expected_segment_work_size(probe_result: ProbeResult) -> int:
+    """
+    Returns the expected size in bytes of the segment work directory written next to the output file.
+    It holds the source video split into segments, the encoded segments and the video they are joined into
+    until the output file has been written.
+    """
+
+    source_size: int = get_source_size(probe_result)
+
+    return source_size + 2 * int(source_size * transcode_size_factor)
+
+
+def has_free_space(directory: str, required_size: int) -> bool:
+    """
+    Tests if the directory's filesystem has room for a file of the given size, with a safety margin
+    """
+
+    try:
+        free_size: int = shutil.disk_usage(directory).free
+    except OSError:
+        return False
+
+    return free_size >= required_size * free_space_margin
+
+
+def get_scratch_file_path(scratch_directory: str, abspath: str) -> str:
+    """
+    Returns the cache file path for the given source file in the scratch directory.
+    A hash of the source path keeps files with the same name from different directories apart.
+    """
+
+    no_ext: str = os.path.splitext(os.path.basename(abspath))[0]
+    path_hash: str = hashlib.sha1(abspath.encode('utf-8', 'surrogateescape')).hexdigest()[:12]
+
+    return os.path.join(scratch_directory, f'{no_ext}.{path_hash}.cache.mkv')
+
+
+def reflink_file(source_fd: int, destination_fd: int, size: int) -> bool:
+    """
+    Clones the source file's extents into the destination (FICLONE), so no data is copied.
+    Only supported within a filesystem that shares extents, such as btrfs or xfs.
+    """
+
+    if fcntl is None:
+        return False
+
+    fcntl.ioctl(destination_fd, FICLONE, source_fd)
+
+    return True
+
+
+def copy_with_copy_file_range(source_fd: int, destination_fd: int, size: int) -> bool:
+    """
+    Copies the file inside the kernel with copy_file_range, which also lets network filesystems copy server side
+    """
+
+    if not hasattr(os, 'copy_file_range'):
+        return False
+
+    offset: int = 0
+    while offset < size:
+        copied: int = os.copy_file_range(source_fd, destination_fd, min(size - offset, copy_buffer_size), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+
+    return offset == size
+
+
+def copy_with_sendfile(source_fd: int, destination_fd: int, size: int) -> bool:
+    """
+    Copies the file inside the kernel with sendfile
+    """
+
+    if not hasattr(os, 'sendfile'):
+        return False
+
+    offset: int = 0
+    while offset < size:
+        sent: int = os.sendfile(destination_fd, source_fd, offset, min(size - offset, copy_buffer_size))
+        if sent == 0:
+            break
+        offset += sent
+
+    return offset == size
+
+
+def copy_with_buffer(source_fd: int, destination_fd: int, size: int) -> bool:
+    """
+    Copies the file in chunks through a userspace buffer
+    """
+
+    offset: int = 0
+    while offset < size:
+        chunk: bytes = os.read(source_fd, copy_buffer_size)
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            written: int = os.write(destination_fd, view)
+            view = view[written:]
+        offset += len(chunk)
+
+    return offset == size
+
+
+# Methods tried in order to copy a file's data across devices. Each returns False, or raises, if it can't be used.
+copy_methods: list = [
+    ('reflink', reflink_file),
+    ('copy_file_range', copy_with_copy_file_range),
+    ('sendfile', copy_with_sendfile),
+    ('copy', copy_with_buffer),
+]
+
+
+def copy_file_data(source_fd: int, destination_fd: int) -> str:
+    """
+    Copies all data of the source file into the empty destination file with the cheapest method available.
+    Returns the name of the method used.
+    """
+
+    size: int = os.fstat(source_fd).st_size
+
+    for method_name, copy_method in copy_methods:
+        try:
+            if copy_method(source_fd, destination_fd, size):
+                return method_name
+        except OSError as e:
+            logger.debug(f'Unable to copy with {method_name}: {e}')
+
+        # Starts the next method from an empty destination
+        os.ftruncate(destination_fd, 0)
+        os.lseek(destination_fd, 0, os.SEEK_SET)
+        os.lseek(source_fd, 0, os.SEEK_SET)
+
+    raise OSError(errno.EIO, 'Unable to copy file data')
+
+
+def fsync_directory(directory: str) -> None:
+    """
+    Flushes a directory entry to disk so that a rename into it survives a crash.
+    Directories can't be opened on Windows, where this is skipped.
+    """
+
+    try:
+        directory_fd: int = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_fd)
+
+
+def move_into_place(file_in: str, file_out: str) -> str:
+    """
+    Moves the processed file to its destination, replacing any existing file atomically, and returns how it was moved.
+    On the same filesystem this is a single rename. Otherwise the data is reflinked or copied to a .part file
+    next to the destination, flushed to disk and renamed over it, so the destination is never left half written.
+    """
+
+    try:
+        os.replace(file_in, file_out)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    else:
+        fsync_directory(os.path.dirname(file_out))
+        return 'rename'
+
+    part_file: str = f'{file_out}.part'
+    try:
+        with open(file_in, 'rb') as source, open(part_file, 'wb') as destination:
+            method_name: str = copy_file_data(source.fileno(), destination.fileno())
+            os.fsync(destination.fileno())
+        shutil.copymode(file_in, part_file)
+        os.replace(part_file, file_out)
+    except BaseException:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise
+
+    fsync_directory(os.path.dirname(file_out))
+    os.remove(file_in)
+
+    return method_name
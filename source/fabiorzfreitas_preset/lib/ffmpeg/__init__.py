@@ -26,7 +26,8 @@ from __future__ import absolute_import
 import warnings
 
 from .parser import Parser
-from .probe import Probe
+from .probe import Probe, ProbeEnvironment, ProbeResult, StreamInfo
+from .probe_cache import ProbeCache
 from .stream_mapper import StreamMapper
 
 __author__ = 'Josh.5 (jsunnex@gmail.com)'
@@ -34,5 +35,9 @@ __author__ = 'Josh.5 (jsunnex@gmail.com)'
 __all__ = (
     'Parser',
     'Probe',
+    'ProbeEnvironment',
+    'ProbeCache',
+    'ProbeResult',
+    'StreamInfo',
     'StreamMapper',
 )
@@ -21,13 +21,32 @@
         If not, see <https://www.gnu.org/licenses/>.
 
 """
-import datetime
 import math
 import re
 from logging import Logger
 
 from .probe import Probe
 
+# A single pattern matching every progress field in an FFmpeg stats line.
+# Each alternative ends in a named group so that 'match.lastgroup' identifies the field.
+progress_regex = re.compile(
+    r"frame=\s*(?P<frame>\d+)"
+    r"|time=\s*(?P<hours>\d+):(?P<minutes>\d+):(?P<seconds>\d+)\.\d+"
+    r"|speed=\s*(?P<speed>\d+\.\d+)"
+    r"|bitrate=\s*(?P<bitrate>\d+\.\d+\w+|\d+w)"
+    r"|size=\s*(?P<size>\d+\w+|\d+.\d+\w+)"
+)
+
+# Patterns compiled by get_progress_from_regex_of_string()
+compiled_regexes = {}
+
+# Keys written by 'ffmpeg -progress'. Every block of these ends with a 'progress=continue' or 'progress=end' line.
+# Per-stream quality keys (e.g. 'stream_0_0_q') are matched by prefix.
+progress_pipe_keys = frozenset([
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms', 'out_time', 'dup_frames',
+    'drop_frames', 'speed', 'progress',
+])
+
 
 class Parser(object):
     """
@@ -41,6 +60,7 @@ class Parser(object):
     frame = '0'
     speed = '0'
     bitrate = '0'
+    file_size = '0'
 
     src_fps = None
     duration = None
@@ -48,6 +68,8 @@ class Parser(object):
 
     def __init__(self, logger: Logger, duration=None, total_frames=None):
         self.logger = logger
+        # Values of the current '-progress' block, applied when its 'progress=' line is read
+        self.progress_block = {}
 
     def set_probe(self, probe: Probe):
         """
@@ -93,36 +115,41 @@ class Parser(object):
         """
         Given a single line of STDOUT text, parse it using regex and extract progress as a percent value.
 
+        Lines written by 'ffmpeg -progress pipe:1' (one 'key=value' per line) are also accepted.
+
         :param line_text:
         :return:
         """
+        # Fetch data from a '-progress' key=value line
+        if line_text and self.parse_progress_pipe_line(line_text):
+            return {
+                'percent': self.percent
+            }
+
         # Fetch data from line text
         if line_text and 'frame=' in line_text:
-            # Update time
-            _time = self.get_progress_from_regex_of_string(line_text, r"time=(\s+|)(\d+:\d+:\d+\.\d+)", self.time)
-            if _time:
-                self.time = str(self.time_string_to_seconds(_time))
+            # Extract all fields in a single pass. If a field appears more than once, the last value is used.
+            _frame = None
+            for match in progress_regex.finditer(line_text):
+                field = match.lastgroup
+                if field == 'frame':
+                    _frame = match.group('frame')
+                elif field == 'seconds':
+                    self.time = str(int(match.group('hours')) * 3600 +
+                                    int(match.group('minutes')) * 60 +
+                                    int(match.group('seconds')))
+                elif field == 'speed':
+                    self.speed = match.group('speed')
+                elif field == 'bitrate':
+                    self.bitrate = "{}/s".format(match.group('bitrate'))
+                elif field == 'size':
+                    self.file_size = match.group('size')
 
             # Update frames
-            _frame = self.get_progress_from_regex_of_string(line_text, r"frame=(\s+|)(\d+)", self.frame)
             if _frame and int(_frame) > int(self.frame):
                 self.frame = _frame
-
-            # Update speed
-            _speed = self.get_progress_from_regex_of_string(line_text, r"speed=(\s+|)(\d+\.\d+)", self.speed)
-            if _speed:
-                self.speed = str(_speed)
-
-            # Update bitrate
-            _bitrate = self.get_progress_from_regex_of_string(line_text, r"bitrate=(\s+|)(\d+\.\d+\w+|\d+w)",
-                                                              self.bitrate)
-            if _bitrate:
-                self.bitrate = "{}/s".format(_bitrate)
-
-            # Update file size
-            _size = self.get_progress_from_regex_of_string(line_text, r"size=(\s+|)(\d+\w+|\d+.\d+\w+)", self.frame)
-            if _size:
-                self.file_size = _size
+            else:
+                _frame = self.frame
 
             # Update percent
             _percent = None
@@ -145,16 +172,77 @@ class Parser(object):
             'percent': self.percent
         }
 
+    def parse_progress_pipe_line(self, line_text):
+        """
+        Consume a single 'key=value' line written by 'ffmpeg -progress'.
+        Values are collected until the 'progress=' line that ends each block, then the progress is updated.
+        Returns False if the line is not part of a progress block.
+
+        :param line_text:
+        :return:
+        """
+        key, separator, value = line_text.strip().partition('=')
+        if not separator or '=' in value:
+            return False
+        if key not in progress_pipe_keys and not key.startswith('stream_'):
+            return False
+
+        if key != 'progress':
+            self.progress_block[key] = value.strip()
+            return True
+
+        block = self.progress_block
+        self.progress_block = {}
+
+        # Update time. 'out_time_ms' is also in microseconds, it is only used by older FFmpeg versions.
+        out_time_us = None
+        try:
+            out_time_us = int(block.get('out_time_us', block.get('out_time_ms')))
+        except (TypeError, ValueError):
+            pass
+        if out_time_us is not None and out_time_us > 0:
+            self.time = str(out_time_us // 1000000)
+
+        # Update frames
+        _frame = block.get('frame', '')
+        if _frame.isdigit() and int(_frame) > int(self.frame):
+            self.frame = _frame
+
+        # Update speed, bitrate and file size
+        _speed = block.get('speed', 'N/A')
+        if _speed != 'N/A':
+            self.speed = _speed.rstrip('x')
+        _bitrate = block.get('bitrate', 'N/A')
+        if _bitrate != 'N/A':
+            self.bitrate = _bitrate
+        _size = block.get('total_size', 'N/A')
+        if _size.isdigit():
+            self.file_size = _size
+
+        # Update percent
+        # The output time is exact, so it is preferred over the frame count. It also advances for audio only outputs.
+        _percent = None
+        if value == 'end':
+            _percent = 100
+        elif out_time_us and self.duration and self.duration > 0:
+            _percent = math.trunc(out_time_us / (self.duration * 1000000) * 100)
+        elif self.total_frames and int(self.frame) > 0:
+            _percent = math.trunc(int(self.frame) / int(self.total_frames) * 100)
+        if _percent and int(_percent) > int(self.percent):
+            self.percent = str(min(_percent, 100))
+
+        return True
+
     @staticmethod
     def time_string_to_seconds(time_string):
         """
-        Converts a time string from the FFmpeg output into an epoch timestamp
+        Converts a time string from the FFmpeg output (HH:MM:SS.ff) into a number of whole seconds
 
         :param time_string:
         :return:
         """
-        pt = datetime.datetime.strptime(time_string, '%H:%M:%S.%f')
-        return pt.second + pt.minute * 60 + pt.hour * 3600
+        hours, minutes, seconds = time_string.split(':')
+        return int(seconds.split('.')[0]) + int(minutes) * 60 + int(hours) * 3600
 
     @staticmethod
     def get_progress_from_regex_of_string(line, regex_string, default=None):
@@ -171,8 +259,10 @@ class Parser(object):
             default = 0
 
         return_value = default
-        regex = re.compile(regex_string)
-        findall = re.findall(regex, line)
+        regex = compiled_regexes.get(regex_string)
+        if regex is None:
+            regex = compiled_regexes[regex_string] = re.compile(regex_string)
+        findall = regex.findall(line)
         if findall:
             split_list = findall[-1]
             if len(split_list) == 2:
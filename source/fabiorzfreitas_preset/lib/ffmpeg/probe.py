@@ -21,14 +21,19 @@
         If not, see <https://www.gnu.org/licenses/>.
 
 """
+import asyncio
 import json
 import mimetypes
 import os
 import shutil
 import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from logging import Logger
 
 from .mimetype_overrides import MimetypeOverrides
+from .probe_cache import ProbeCache
 
 
 class FFProbeError(Exception):
@@ -37,77 +42,575 @@ class FFProbeError(Exception):
     Custom exception for errors encountered while executing the ffprobe command.
     """
 
-    def __init___(self, path, info):
+    def __init__(self, path, info):
         Exception.__init__(self, "Unable to fetch data from file {}. {}".format(path, info))
         self.path = path
         self.info = info
 
 
-def ffprobe_cmd(params):
+class ProbeEnvironment(object):
     """
-    Execute a ffprobe command subprocess and read the output
+    ProbeEnvironment
+
+    Process-wide state shared by every Probe instance. It is created on first use with ProbeEnvironment.get().
+
+    Holds the resolved path of the ffprobe executable and a MIME type database including the MimetypeOverrides,
+    along with a table of file extension to MIME type category ('video', 'audio', ...) built from it.
+    Building these once avoids a PATH search, a re-read of the system MIME type files and a re-registration of all
+    overrides for every Probe that is created.
+    The global 'mimetypes' module state is left untouched.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.ffprobe_path = None
+
+        # Read the system mimetype files once, as mimetypes.init() would
+        self.mimetypes = mimetypes.MimeTypes()
+        self.mimetypes.read_windows_registry()
+        for file_name in mimetypes.knownfiles:
+            if os.path.isfile(file_name):
+                self.mimetypes.read(file_name)
+
+        # Add mimetype overrides to the mimetype database (replaces any existing entries)
+        all_mimetype_overrides = MimetypeOverrides().get_all()
+        for extension in all_mimetype_overrides:
+            self.mimetypes.add_type(all_mimetype_overrides.get(extension), extension)
+
+        # Compression and alias suffixes (e.g. '.gz', '.tgz') are left to guess_type(), which also reads the
+        # extension before them
+        self.extension_categories = {
+            extension: file_type.split('/')[0] for extension, file_type in self.mimetypes.types_map[True].items()
+            if extension not in self.mimetypes.encodings_map and extension not in self.mimetypes.suffix_map
+        }
+
+    @classmethod
+    def get(cls):
+        """
+        Return the shared ProbeEnvironment, creating it on first use
+
+        :return:
+        """
+        environment = cls._instance
+        if environment is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+                environment = cls._instance
+        return environment
+
+    def get_ffprobe_path(self):
+        """
+        Return the path of the ffprobe executable, or None if it is not installed.
+        A missing executable is looked up again on the next call.
+
+        :return:
+        """
+        if self.ffprobe_path is None:
+            self.ffprobe_path = shutil.which('ffprobe')
+        return self.ffprobe_path
+
+    def get_mimetype_category(self, file_path):
+        """
+        Return the MIME type category ('video', 'audio', 'image', ...) of the given file, or None if unknown.
+        Plain extensions are looked up in the precomputed table. Anything else (compressed or unknown
+        extensions) falls back to the MIME type database.
+
+        :param file_path:
+        :return:
+        """
+        extension = os.path.splitext(file_path)[1]
+        category = self.extension_categories.get(extension)
+        if category is None:
+            category = self.extension_categories.get(extension.lower())
+        if category is None:
+            file_type = self.mimetypes.guess_type(file_path)[0]
+            if file_type is not None:
+                category = file_type.split('/')[0]
+        return category
+
+
+# Seconds an ffprobe process may run before it is killed
+ffprobe_timeout = 60
+
+# Largest ffprobe output accepted. The process is killed once it writes more than this.
+ffprobe_max_output_bytes = 64 * 1024 * 1024
+
+# Only the end of stderr is kept for error messages
+ffprobe_max_stderr_bytes = 64 * 1024
+
+
+def _read_pipe(pipe, chunks, max_bytes, keep_tail=False):
+    """
+    Read a subprocess pipe into a list of chunks until it is closed.
+    Once more than max_bytes have been read, reading stops, or with keep_tail, only the last max_bytes are kept.
+
+    :param pipe:
+    :param chunks:
+    :param max_bytes:
+    :param keep_tail:
+    :return:
+    """
+    total_bytes = 0
+    while True:
+        chunk = pipe.read(65536)
+        if not chunk:
+            return
+        chunks.append(chunk)
+        total_bytes += len(chunk)
+        if total_bytes > max_bytes:
+            if not keep_tail:
+                return
+            tail = b''.join(chunks)[-max_bytes:]
+            chunks[:] = [tail]
+            total_bytes = len(tail)
+
+
+def ffprobe_cmd(params, timeout=None, max_output_bytes=None):
+    """
+    Execute a ffprobe command subprocess and read the output.
+    stdout and stderr are read separately. The process is killed if it runs for longer than the timeout
+    or writes more than max_output_bytes to stdout.
 
     :param params:
+    :param timeout:
+    :param max_output_bytes:
     :return:
     """
-    command = ["ffprobe"] + params
+    if timeout is None:
+        timeout = ffprobe_timeout
+    if max_output_bytes is None:
+        max_output_bytes = ffprobe_max_output_bytes
+    command = [ProbeEnvironment.get().get_ffprobe_path() or "ffprobe"] + params
+
+    pipe = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # stderr is drained on a second thread so that neither pipe can fill up and block ffprobe
+    err_chunks = []
+    err_reader = threading.Thread(target=_read_pipe, args=(pipe.stderr, err_chunks, ffprobe_max_stderr_bytes, True),
+                                  daemon=True)
+    err_reader.start()
+
+    out_chunks = []
+    out_reader = threading.Thread(target=_read_pipe, args=(pipe.stdout, out_chunks, max_output_bytes), daemon=True)
+    out_reader.start()
+
+    # The timeout covers the whole run, reading stdout and waiting for ffprobe to exit share one deadline
+    deadline = time.monotonic() + timeout
+    failure = None
+    out_reader.join(timeout)
+    if out_reader.is_alive():
+        failure = 'Timed out after {} seconds'.format(timeout)
+    elif sum(len(chunk) for chunk in out_chunks) > max_output_bytes:
+        failure = 'Output exceeded {} bytes'.format(max_output_bytes)
+    if failure is None:
+        try:
+            pipe.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            failure = 'Timed out after {} seconds'.format(timeout)
+
+    if failure is not None:
+        pipe.kill()
+        pipe.wait()
+    out_reader.join()
+    err_reader.join()
+    pipe.stdout.close()
+    pipe.stderr.close()
+    if failure is not None:
+        raise FFProbeError(command, failure)
+
+    return _read_ffprobe_output(command, b''.join(out_chunks), b''.join(err_chunks), pipe.returncode)
 
-    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    out, err = pipe.communicate()
 
-    # Check for results
+async def affprobe_cmd(params, timeout=None, max_output_bytes=None):
+    """
+    Async variant of ffprobe_cmd() using an asyncio subprocess.
+    The process is killed if it runs for longer than the timeout or writes more than max_output_bytes to stdout.
+
+    :param params:
+    :param timeout:
+    :param max_output_bytes:
+    :return:
+    """
+    if timeout is None:
+        timeout = ffprobe_timeout
+    if max_output_bytes is None:
+        max_output_bytes = ffprobe_max_output_bytes
+    command = [ProbeEnvironment.get().get_ffprobe_path() or "ffprobe"] + params
+
+    process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+    async def read_stream(stream, max_bytes, keep_tail):
+        chunks = []
+        total_bytes = 0
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                return b''.join(chunks), False
+            chunks.append(chunk)
+            total_bytes += len(chunk)
+            if total_bytes > max_bytes:
+                if not keep_tail:
+                    return b''.join(chunks), True
+                tail = b''.join(chunks)[-max_bytes:]
+                chunks = [tail]
+                total_bytes = len(tail)
+
+    async def communicate():
+        err_task = asyncio.ensure_future(read_stream(process.stderr, ffprobe_max_stderr_bytes, True))
+        try:
+            out, exceeded = await read_stream(process.stdout, max_output_bytes, False)
+            if exceeded:
+                return out, b'', 'Output exceeded {} bytes'.format(max_output_bytes)
+            err, _ = await err_task
+            await process.wait()
+            return out, err, None
+        finally:
+            err_task.cancel()
+
+    try:
+        out, err, failure = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        out, err, failure = b'', b'', 'Timed out after {} seconds'.format(timeout)
+    except BaseException:
+        # Cancelled by the caller
+        await _kill_process(process)
+        raise
+
+    if failure is not None:
+        await _kill_process(process)
+        raise FFProbeError(command, failure)
+
+    return _read_ffprobe_output(command, out, err, process.returncode)
+
+
+async def _kill_process(process):
+    """
+    Kill an asyncio subprocess and wait for it to exit.
+    The process is only reported as finished once its pipes are closed, so any unread output is discarded.
+
+    :param process:
+    :return:
+    """
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.communicate()
+
+
+def _read_ffprobe_output(command, out, err, returncode):
+    """
+    Check the output of a finished ffprobe process and return it decoded
+
+    :param command:
+    :param out:
+    :param err:
+    :param returncode:
+    :return:
+    """
     try:
         raw_output = out.decode("utf-8")
     except Exception as e:
         raise FFProbeError(command, str(e))
-    if pipe.returncode == 1 or 'error' in raw_output:
-        raise FFProbeError(command, raw_output)
+    if returncode != 0:
+        raise FFProbeError(command, err.decode("utf-8", "replace").strip() or raw_output)
     if not raw_output:
         raise FFProbeError(command, 'No info found')
 
     return raw_output
 
 
-def ffprobe_file(vid_file_path):
+# The sections requested from ffprobe for each probe profile.
+#   - 'full' dumps the complete format, stream and chapter information.
+#   - 'lean' only requests the entries needed to test streams, build a command and parse progress.
+#     Its output is a fraction of the size for files with many chapters, attachments or tags.
+#     A lean probe still contains a 'chapters' list, but each chapter only has its 'id'.
+probe_profiles = {
+    'full': [
+        "-show_format",
+        "-show_streams",
+        "-show_error",
+        "-show_chapters",
+    ],
+    'lean': [
+        "-show_error",
+        "-show_entries",
+        "format=filename,format_name,duration,size,bit_rate"
+        ":stream=index,codec_type,codec_name,avg_frame_rate,width,height,coded_width,coded_height,duration"
+        ":stream_tags"
+        ":chapter=id",
+    ],
+}
+
+
+def _read_error_object(output):
     """
-    Returns a dictionary result from ffprobe command line prove of a file
+    Return the message of the 'error' object in an ffprobe JSON output, or None if there is none.
+    The output may be the parsed dictionary or the raw JSON string.
 
-    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param output:
+    :return:
+    """
+    if isinstance(output, str):
+        try:
+            output = json.loads(output)
+        except ValueError:
+            return None
+    if not isinstance(output, dict) or not isinstance(output.get('error'), dict):
+        return None
+    error = output['error']
+    return '{} (code {})'.format(error.get('string', 'Unknown error'), error.get('code'))
+
+
+def _ffprobe_file_params(vid_file_path, profile):
+    """
+    Return the ffprobe params used to probe a file with the given profile
+
+    :param vid_file_path:
+    :param profile:
     :return:
     """
     if type(vid_file_path) != str:
         raise Exception('Give ffprobe a full file path of the video')
+    if profile not in probe_profiles:
+        raise Exception("Probe profile must be one of [{}]".format(', '.join(probe_profiles)))
 
     params = [
         "-loglevel", "quiet",
         "-print_format", "json",
-        "-show_format",
-        "-show_streams",
-        "-show_error",
-        "-show_chapters",
-        vid_file_path
     ]
+    params += probe_profiles[profile]
+    params += [vid_file_path]
+    return params
 
-    # Check result
-    results = ffprobe_cmd(params)
+
+def _parse_ffprobe_file_output(vid_file_path, results, stats=None):
+    """
+    Parse the JSON output of ffprobe for a file.
+    ffprobe reports errors in an 'error' object (-show_error).
+
+    :param vid_file_path:
+    :param results:
+    :param stats:
+    :return:
+    """
+    parse_start = time.perf_counter()
     try:
         info = json.loads(results)
     except Exception as e:
         raise FFProbeError(vid_file_path, str(e))
+    error = _read_error_object(info)
+    if error is not None:
+        raise FFProbeError(vid_file_path, error)
+    if stats is not None:
+        stats['output_bytes'] = len(results)
+        stats['parse_seconds'] = time.perf_counter() - parse_start
 
     return info
 
 
+def ffprobe_file(vid_file_path, profile='full', stats=None):
+    """
+    Returns a dictionary result from ffprobe command line prove of a file
+
+    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param profile: The probe profile to use. One of the keys of 'probe_profiles'.
+    :param stats: Optional dictionary that will be updated with the output size and JSON parse time.
+    :return:
+    """
+    params = _ffprobe_file_params(vid_file_path, profile)
+
+    # Check result
+    # A failed probe exits with a non-zero code, but still writes the 'error' object
+    try:
+        results = ffprobe_cmd(params)
+    except FFProbeError as e:
+        error = _read_error_object(e.info)
+        if error is not None:
+            raise FFProbeError(vid_file_path, error)
+        raise
+
+    return _parse_ffprobe_file_output(vid_file_path, results, stats=stats)
+
+
+async def affprobe_file(vid_file_path, profile='full', stats=None):
+    """
+    Async variant of ffprobe_file()
+
+    :param vid_file_path: The absolute (full) path of the video file, string.
+    :param profile: The probe profile to use. One of the keys of 'probe_profiles'.
+    :param stats: Optional dictionary that will be updated with the output size and JSON parse time.
+    :return:
+    """
+    params = _ffprobe_file_params(vid_file_path, profile)
+
+    # Check result
+    # A failed probe exits with a non-zero code, but still writes the 'error' object
+    try:
+        results = await affprobe_cmd(params)
+    except FFProbeError as e:
+        error = _read_error_object(e.info)
+        if error is not None:
+            raise FFProbeError(vid_file_path, error)
+        raise
+
+    return _parse_ffprobe_file_output(vid_file_path, results, stats=stats)
+
+
+# Streams of a library share a small number of distinct tag key sets, so a single instance of each set is kept
+_interned_tag_keys = {}
+
+
+class StreamInfo(object):
+    """
+    StreamInfo
+
+    Compact, read-only view of a single stream from a file probe.
+    Only the values used to test streams are kept. Tag values are dropped, except for the language.
+    """
+
+    __slots__ = (
+        'index',
+        'codec_type',
+        'codec_name',
+        'avg_frame_rate',
+        'width',
+        'height',
+        'language',
+        'tag_keys',
+    )
+
+    def __init__(self, stream: dict):
+        tags = stream.get('tags') or {}
+        self.index = stream.get('index')
+        self.codec_type = stream.get('codec_type', '')
+        self.codec_name = stream.get('codec_name', '')
+        self.avg_frame_rate = stream.get('avg_frame_rate')
+        self.width = stream.get('width', stream.get('coded_width', 0))
+        self.height = stream.get('height', stream.get('coded_height', 0))
+        self.language = tags.get('language')
+        tag_keys = frozenset(tags)
+        self.tag_keys = _interned_tag_keys.setdefault(tag_keys, tag_keys)
+
+    def __repr__(self):
+        return "StreamInfo(index={}, codec_type='{}', codec_name='{}')".format(self.index, self.codec_type,
+                                                                               self.codec_name)
+
+
+class ProbeResult(object):
+    """
+    ProbeResult
+
+    Compact representation of a file probe, built once from the ffprobe output.
+
+    Streams are held in a tuple of StreamInfo objects in probe order. Per codec type lookups are precomputed:
+        - 'stream_positions' maps a codec type to the positions of its streams in 'streams'.
+        - 'codec_names' maps a codec type to the set of codec names found for that type.
+        - 'tag_keys' is the set of tag keys found across all streams.
+    """
+
+    __slots__ = (
+        'filename',
+        'format_name',
+        'duration',
+        'size',
+        'bit_rate',
+        'streams',
+        'stream_positions',
+        'codec_names',
+        'chapter_count',
+        'tag_keys',
+    )
+
+    def __init__(self, probe_info: dict):
+        file_format = probe_info.get('format', {})
+        self.filename = file_format.get('filename')
+        self.format_name = file_format.get('format_name')
+        self.duration = self.__to_float(file_format.get('duration'))
+        self.size = self.__to_int(file_format.get('size'))
+        self.bit_rate = self.__to_int(file_format.get('bit_rate'))
+
+        self.streams = tuple(StreamInfo(stream) for stream in probe_info.get('streams', []))
+
+        stream_positions = {}
+        codec_names = {}
+        tag_keys = set()
+        for position, stream in enumerate(self.streams):
+            stream_positions.setdefault(stream.codec_type, []).append(position)
+            codec_names.setdefault(stream.codec_type, set()).add(stream.codec_name)
+            tag_keys.update(stream.tag_keys)
+        self.stream_positions = {codec_type: tuple(positions) for codec_type, positions in stream_positions.items()}
+        self.codec_names = {codec_type: frozenset(names) for codec_type, names in codec_names.items()}
+        self.tag_keys = frozenset(tag_keys)
+
+        self.chapter_count = len(probe_info.get('chapters', []))
+
+    @staticmethod
+    def __to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def __to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def streams_of_type(self, codec_type: str):
+        """Return a tuple of the streams of the given codec type, in probe order"""
+        return tuple(self.streams[position] for position in self.stream_positions.get(codec_type, ()))
+
+    def stream_count(self, codec_type: str):
+        """Return the number of streams of the given codec type"""
+        return len(self.stream_positions.get(codec_type, ()))
+
+    def first_of_type(self, codec_type: str):
+        """Return the first stream of the given codec type, or None if there is none"""
+        positions = self.stream_positions.get(codec_type)
+        if not positions:
+            return None
+        return self.streams[positions[0]]
+
+    @property
+    def first_video(self):
+        """The first video stream, or None"""
+        return self.first_of_type('video')
+
+    @property
+    def first_audio(self):
+        """The first audio stream, or None"""
+        return self.first_of_type('audio')
+
+    def codec_names_of_type(self, codec_type: str):
+        """Return the set of codec names found for the given codec type"""
+        return self.codec_names.get(codec_type, frozenset())
+
+    def has_codec_type(self, codec_type: str):
+        """Return True if the file has at least one stream of the given codec type"""
+        return codec_type in self.stream_positions
+
+
 class Probe(object):
     """
     Probe
     """
 
     probe_info = {}
+    probe_stats = {}
+    probe_result = None
 
-    def __init__(self, logger: Logger, allowed_mimetypes=None):
+    def __init__(self, logger: Logger, allowed_mimetypes=None, cache: ProbeCache = None, profile='full'):
         # Ensure ffprobe is installed
-        if shutil.which('ffprobe') is None:
+        self.environment = ProbeEnvironment.get()
+        if self.environment.get_ffprobe_path() is None:
             raise Exception("Unable to find executable 'ffprobe'. Please ensure that FFmpeg is installed correctly.")
 
         self.logger = logger
@@ -115,16 +618,15 @@ class Probe(object):
             allowed_mimetypes = ['audio', 'video', 'image']
         self.allowed_mimetypes = allowed_mimetypes
 
-        # Init (reset) our mimetype list
-        mimetypes.init()
+        # Optional persistent cache of probe results
+        self.cache = cache
 
-        # Add mimetype overrides to mimetype dictionary (replaces any existing entries)
-        mimetype_overrides = MimetypeOverrides()
-        all_mimetype_overrides = mimetype_overrides.get_all()
-        for extension in all_mimetype_overrides:
-            mimetypes.add_type(all_mimetype_overrides.get(extension), extension)
+        # The ffprobe profile used when probing files
+        if profile not in probe_profiles:
+            raise Exception("Probe profile must be one of [{}]".format(', '.join(probe_profiles)))
+        self.profile = profile
 
-    def __test_valid_mimetype(self, file_path):
+    def test_valid_mimetype(self, file_path):
         """
         Test the given file path for its mimetype.
         If the mimetype cannot be detected, it will fail this test.
@@ -135,32 +637,35 @@ class Probe(object):
         :return:
         """
         # Only run this check against video/audio/image MIME types
-        file_type = mimetypes.guess_type(file_path)[0]
+        file_type_category = self.environment.get_mimetype_category(file_path)
 
         # If the file has no MIME type then it cannot be tested
-        if file_type is None:
-            self.logger.debug("Unable to fetch file MIME type - '{}'".format(file_path))
+        if file_type_category is None:
+            self.logger.debug("Unable to fetch file MIME type - '%s'", file_path)
             return False
 
         # Make sure the MIME type is either audio, video or image
-        file_type_category = file_type.split('/')[0]
         if file_type_category not in self.allowed_mimetypes:
-            self.logger.debug("File MIME type not in [{}] - '{}'".format(', '.join(self.allowed_mimetypes), file_path))
+            self.logger.debug("File MIME type not in %s - '%s'", self.allowed_mimetypes, file_path)
             return False
 
         return True
 
     @staticmethod
-    def init_probe(data, logger, allowed_mimetypes=None):
+    def init_probe(data, logger, allowed_mimetypes=None, cache=None, profile='full'):
         """
         Fetch the Probe object given a plugin's data object
 
+        Only 'full' profile probes are set to 'shared_info', as other plugins expect the complete probe there.
+
         :param data:
         :param logger:
         :param allowed_mimetypes:
+        :param cache:
+        :param profile:
         :return:
         """
-        probe = Probe(logger, allowed_mimetypes=allowed_mimetypes)
+        probe = Probe(logger, allowed_mimetypes=allowed_mimetypes, cache=cache, profile=profile)
         # Start by fetching probe data from 'shared_info'.
         ffprobe_data = data.get('shared_info', {}).get('ffprobe')
         if ffprobe_data:
@@ -176,36 +681,223 @@ class Probe(object):
             return
         # Successfully probed file.
         # Set file probe to 'shared_info' for subsequent file test runners.
+        if profile != 'full':
+            return probe
         if 'shared_info' not in data:
             data['shared_info'] = {}
         data['shared_info']['ffprobe'] = probe.get_probe()
         return probe
 
-    def file(self, file_path):
+    @staticmethod
+    def probe_many(file_paths, logger, allowed_mimetypes=None, cache=None, max_workers=4, max_workers_per_mount=None,
+                   profile='full'):
         """
-        Sets the 'probe' dict by probing the given file path.
-        Files that are not able to be probed will not set the 'probe' dict.
+        Probe a batch of files concurrently with a bounded pool of threads, each driving an ffprobe subprocess.
+        Results are yielded as they complete (not in the order given) as a tuple of (file_path, probe).
+        The probe is None for files that could not be probed.
+
+        The number of concurrent probes against any one storage device (as reported by 'st_dev') is limited
+        to 'max_workers_per_mount'. Paths are consumed lazily so 'file_paths' may be a generator.
+
+        :param file_paths:
+        :param logger:
+        :param allowed_mimetypes:
+        :param cache:
+        :param max_workers:
+        :param max_workers_per_mount:
+        :param profile:
+        :return:
+        """
+        max_workers = max(1, int(max_workers))
+        if max_workers_per_mount is None:
+            max_workers_per_mount = max_workers
+        max_workers_per_mount = max(1, int(max_workers_per_mount))
+
+        mount_semaphores = {}
+        mount_semaphores_lock = threading.Lock()
+
+        def get_mount_semaphore(file_path):
+            try:
+                device = os.stat(file_path).st_dev
+            except OSError:
+                device = None
+            with mount_semaphores_lock:
+                if device not in mount_semaphores:
+                    mount_semaphores[device] = threading.Semaphore(max_workers_per_mount)
+                return mount_semaphores[device]
+
+        def probe_file(file_path):
+            with get_mount_semaphore(file_path):
+                probe = Probe(logger, allowed_mimetypes=allowed_mimetypes, cache=cache, profile=profile)
+                if not probe.file(file_path):
+                    return file_path, None
+                return file_path, probe
+
+        # Limit the number of queued futures so that large batches are not all held in memory at once
+        max_pending = max_workers * 2
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for file_path in file_paths:
+                pending.add(executor.submit(probe_file, file_path))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    @staticmethod
+    async def aprobe_many(file_paths, logger, allowed_mimetypes=None, cache=None, max_concurrency=4,
+                          profile='full'):
+        """
+        Async variant of probe_many().
+        Probe a batch of files concurrently from the event loop. A semaphore limits the number of ffprobe
+        subprocesses running at once to 'max_concurrency'.
+        Results are yielded as they complete (not in the order given) as a tuple of (file_path, probe).
+        The probe is None for files that could not be probed.
+
+        'file_paths' may be a regular or an async iterable. Paths are consumed lazily.
+
+        :param file_paths:
+        :param logger:
+        :param allowed_mimetypes:
+        :param cache:
+        :param max_concurrency:
+        :param profile:
+        :return:
+        """
+        max_concurrency = max(1, int(max_concurrency))
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def probe_file(file_path):
+            async with semaphore:
+                probe = Probe(logger, allowed_mimetypes=allowed_mimetypes, cache=cache, profile=profile)
+                if not await probe.afile(file_path):
+                    return file_path, None
+                return file_path, probe
+
+        async def iterate_paths():
+            if hasattr(file_paths, '__aiter__'):
+                async for path in file_paths:
+                    yield path
+            else:
+                for path in file_paths:
+                    yield path
+
+        # Limit the number of queued tasks so that large batches are not all held in memory at once
+        max_pending = max_concurrency * 2
+        pending = set()
+        try:
+            async for file_path in iterate_paths():
+                pending.add(asyncio.ensure_future(probe_file(file_path)))
+                if len(pending) >= max_pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # The caller stopped iterating early. Do not leave ffprobe processes running.
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def __read_cached_probe(self, file_path):
+        """
+        Reset the probe and check if the given file can be probed.
+        Returns a tuple of (status, file_key). The status is True if the probe was read from the cache,
+        None if the file should not be probed and False if ffprobe needs to be run.
 
         :param file_path:
         :return:
         """
         self.probe_info = {}
+        self.probe_result = None
+        self.probe_stats = {}
 
         # Ensure file exists
         if not os.path.exists(file_path):
-            self.logger.debug("File does not exist - '{}'".format(file_path))
-            return
+            self.logger.debug("File does not exist - '%s'", file_path)
+            return None, None
+
+        if not self.test_valid_mimetype(file_path):
+            return None, None
 
-        if not self.__test_valid_mimetype(file_path):
+        # Read the file key before probing so that changes made during the probe invalidate the entry
+        file_key = None
+        if self.cache is not None:
+            file_key = self.cache.file_key(file_path)
+            cached_probe_info = self.cache.get(file_path, file_key=file_key, profile=self.profile)
+            if cached_probe_info:
+                self.probe_info = cached_probe_info
+                self.probe_stats['cached'] = True
+                return True, file_key
+
+        return False, file_key
+
+    def __store_probe(self, file_path, probe_info, file_key):
+        self.probe_info = probe_info
+        # Logged with lazy arguments, as this runs for every probed file
+        self.logger.debug("Probed file with '%s' profile. Output %s bytes, parsed in %.3f ms - '%s'", self.profile,
+                          self.probe_stats.get('output_bytes'), self.probe_stats.get('parse_seconds', 0) * 1000,
+                          file_path)
+        if self.cache is not None and file_key is not None:
+            self.cache.put(file_path, self.probe_info, file_key=file_key, profile=self.profile)
+
+    def file(self, file_path):
+        """
+        Sets the 'probe' dict by probing the given file path.
+        Files that are not able to be probed will not set the 'probe' dict.
+        If a cache is configured, unchanged files are read from the cache instead of running ffprobe.
+
+        :param file_path:
+        :return:
+        """
+        status, file_key = self.__read_cached_probe(file_path)
+        if status is not False:
+            return status
+
+        probe_start = time.perf_counter()
+        try:
+            # Get the file probe info
+            probe_info = ffprobe_file(file_path, profile=self.profile, stats=self.probe_stats)
+            self.probe_stats['probe_seconds'] = time.perf_counter() - probe_start
+            self.__store_probe(file_path, probe_info, file_key)
+            return True
+        except FFProbeError as e:
+            # This will only happen if it was not a file that could be probed, or if ffprobe timed out.
+            self.probe_stats['probe_seconds'] = time.perf_counter() - probe_start
+            self.logger.debug("File unable to be probed by FFProbe - '%s'. %s", file_path, e.info)
             return
 
+    async def afile(self, file_path):
+        """
+        Async variant of file().
+        The ffprobe subprocess is run with asyncio so the event loop is not blocked while it runs.
+
+        :param file_path:
+        :return:
+        """
+        status, file_key = self.__read_cached_probe(file_path)
+        if status is not False:
+            return status
+
+        probe_start = time.perf_counter()
         try:
             # Get the file probe info
-            self.probe_info = ffprobe_file(file_path)
+            probe_info = await affprobe_file(file_path, profile=self.profile, stats=self.probe_stats)
+            self.probe_stats['probe_seconds'] = time.perf_counter() - probe_start
+            self.__store_probe(file_path, probe_info, file_key)
             return True
-        except FFProbeError:
-            # This will only happen if it was not a file that could be probed.
-            self.logger.debug("File unable to be probed by FFProbe - '{}'".format(file_path))
+        except FFProbeError as e:
+            # This will only happen if it was not a file that could be probed, or if ffprobe timed out.
+            self.probe_stats['probe_seconds'] = time.perf_counter() - probe_start
+            self.logger.debug("File unable to be probed by FFProbe - '%s'. %s", file_path, e.info)
             return
 
     def set_probe(self, probe_info):
@@ -214,16 +906,23 @@ class Probe(object):
         if not file_path:
             self.logger.error("Provided file probe information does not contain the expected 'filename' key.")
             return
-        if not self.__test_valid_mimetype(file_path):
+        if not self.test_valid_mimetype(file_path):
             return
 
         self.probe_info = probe_info
+        self.probe_result = None
         return self.probe_info
 
     def get_probe(self):
         """Return the probe dictionary"""
         return self.probe_info
 
+    def get_result(self):
+        """Return the probe as a ProbeResult. This is built on first use and reused after that."""
+        if self.probe_result is None:
+            self.probe_result = ProbeResult(self.probe_info)
+        return self.probe_result
+
     def get(self, key, default=None):
         """Return the value of the given key from the probe dictionary"""
         return self.probe_info.get(key, default)
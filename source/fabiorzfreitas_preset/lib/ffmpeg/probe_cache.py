@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    plugins.probe_cache.py
+
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     18 Oct 2026, (10:00 AM)
+
+    Copyright:
+        Copyright (C) 2026 Fabiorzfreitas
+
+        This program is free software: you can redistribute it and/or modify it under the terms of the GNU General
+        Public License as published by the Free Software Foundation, version 3.
+
+        This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+        implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License
+        for more details.
+
+        You should have received a copy of the GNU General Public License along with this program.
+        If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ProbeCache(object):
+    """
+    ProbeCache
+
+    Persistent store of ffprobe results backed by a SQLite database.
+
+    Entries are keyed by the absolute path of the probed file. An entry is only returned while the
+    file's size, modification time (ns) and inode still match the values recorded when it was probed,
+    so any change to the file invalidates it automatically.
+    Callers may also attach annotations to an entry (for example, decisions made from the probe). These are
+    validated in the same way and are discarded whenever the entry is replaced.
+    Each entry records the probe profile it was created with. A 'full' probe also satisfies requests for
+    any other profile, but a reduced probe is never returned to a caller that asked for a full one.
+    The number of entries is bounded. Once the limit is exceeded, the least recently used entries are evicted.
+    """
+
+    default_max_entries = 250000
+
+    # Number of writes between checks of the entry count
+    eviction_check_interval = 500
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str, max_entries: int = None):
+        if max_entries is None:
+            max_entries = self.default_max_entries
+        self.db_path = os.path.abspath(db_path)
+        self.max_entries = int(max_entries)
+
+        db_dir = os.path.dirname(self.db_path)
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        # A single connection is shared between threads. All access is serialised with a lock.
+        self._lock = threading.Lock()
+        self._writes_since_eviction_check = self.eviction_check_interval
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.__init_schema()
+
+    @classmethod
+    def open(cls, db_path: str, max_entries: int = None):
+        """
+        Return a shared ProbeCache for the given database path.
+        The cache is created on first use and reused for every subsequent call in this process.
+
+        :param db_path:
+        :param max_entries:
+        :return:
+        """
+        db_path = os.path.abspath(db_path)
+        with cls._instances_lock:
+            cache = cls._instances.get(db_path)
+            if cache is None:
+                cache = cls(db_path, max_entries=max_entries)
+                cls._instances[db_path] = cache
+            elif max_entries is not None:
+                cache.max_entries = int(max_entries)
+        return cache
+
+    def __init_schema(self):
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS probes ('
+                '  path TEXT PRIMARY KEY,'
+                '  size INTEGER NOT NULL,'
+                '  mtime_ns INTEGER NOT NULL,'
+                '  inode INTEGER NOT NULL,'
+                '  probe TEXT NOT NULL,'
+                '  annotations TEXT,'
+                "  profile TEXT NOT NULL DEFAULT 'full',"
+                '  last_access REAL NOT NULL'
+                ')'
+            )
+            # Databases created by earlier versions are missing some columns
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(probes)')]
+            if 'annotations' not in columns:
+                self._conn.execute('ALTER TABLE probes ADD COLUMN annotations TEXT')
+            if 'profile' not in columns:
+                self._conn.execute("ALTER TABLE probes ADD COLUMN profile TEXT NOT NULL DEFAULT 'full'")
+            self._conn.execute('CREATE INDEX IF NOT EXISTS probes_last_access ON probes (last_access)')
+            self._conn.commit()
+
+    @staticmethod
+    def file_key(file_path: str):
+        """
+        Return the (size, mtime_ns, inode) tuple used to validate a cache entry for the given file.
+        Returns None if the file cannot be read.
+
+        :param file_path:
+        :return:
+        """
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+    def get(self, file_path: str, file_key: tuple = None, profile: str = 'full'):
+        """
+        Return the cached probe dictionary for the given file.
+        Returns None if no entry exists, if the file has changed since it was cached or if the
+        cached probe does not contain the requested profile.
+
+        :param file_path:
+        :param file_key:
+        :param profile:
+        :return:
+        """
+        path = os.path.abspath(file_path)
+        if file_key is None:
+            file_key = self.file_key(path)
+            if file_key is None:
+                return None
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, inode, probe, profile FROM probes WHERE path = ?', (path,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[4] != profile and row[4] != 'full':
+                return None
+            if tuple(row[:3]) != tuple(file_key):
+                # The file has changed. Drop the stale entry.
+                self._conn.execute('DELETE FROM probes WHERE path = ?', (path,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE probes SET last_access = ? WHERE path = ?', (time.time(), path))
+            self._conn.commit()
+
+        try:
+            return json.loads(row[3])
+        except ValueError:
+            self.invalidate(path)
+            return None
+
+    def put(self, file_path: str, probe_info: dict, file_key: tuple = None, profile: str = 'full'):
+        """
+        Store the probe dictionary for the given file.
+        The file_key should be read before the file was probed so that a file modified while
+        being probed is not cached against its new size and mtime.
+
+        :param file_path:
+        :param probe_info:
+        :param file_key:
+        :param profile:
+        :return:
+        """
+        path = os.path.abspath(file_path)
+        if file_key is None:
+            file_key = self.file_key(path)
+            if file_key is None:
+                return
+        size, mtime_ns, inode = file_key
+
+        data = json.dumps(probe_info, separators=(',', ':'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO probes (path, size, mtime_ns, inode, probe, profile, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, size, mtime_ns, inode, data, profile, time.time())
+            )
+            self._conn.commit()
+            self._writes_since_eviction_check += 1
+            if self._writes_since_eviction_check >= self.eviction_check_interval:
+                self._writes_since_eviction_check = 0
+                self.__evict()
+
+    def get_annotations(self, file_path: str, file_key: tuple = None):
+        """
+        Return the annotations dictionary attached to the cached entry for the given file.
+        Returns None if there are no annotations or if the file has changed since it was cached.
+
+        :param file_path:
+        :param file_key:
+        :return:
+        """
+        path = os.path.abspath(file_path)
+        if file_key is None:
+            file_key = self.file_key(path)
+            if file_key is None:
+                return None
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, inode, annotations FROM probes WHERE path = ?', (path,)
+            ).fetchone()
+        if row is None or row[3] is None or tuple(row[:3]) != tuple(file_key):
+            return None
+
+        try:
+            return json.loads(row[3])
+        except ValueError:
+            return None
+
+    def set_annotations(self, file_path: str, annotations: dict, file_key: tuple = None):
+        """
+        Attach an annotations dictionary to the cached entry for the given file.
+        Nothing is stored if the file is not cached or has changed since it was cached.
+
+        :param file_path:
+        :param annotations:
+        :param file_key:
+        :return:
+        """
+        path = os.path.abspath(file_path)
+        if file_key is None:
+            file_key = self.file_key(path)
+            if file_key is None:
+                return False
+        size, mtime_ns, inode = file_key
+
+        data = json.dumps(annotations, separators=(',', ':'))
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE probes SET annotations = ? WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?',
+                (data, path, size, mtime_ns, inode)
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def invalidate(self, file_path: str):
+        """Remove the cached entry for the given file"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            self._conn.execute('DELETE FROM probes WHERE path = ?', (path,))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._conn.execute('DELETE FROM probes')
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+
+    def __evict(self):
+        """
+        Remove the least recently used entries once the cache holds more than 'max_entries'.
+        Trims down to 90% of the limit so that eviction does not run on every write.
+        Must be called with the lock held.
+
+        :return:
+        """
+        count = self._conn.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        remove = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            'DELETE FROM probes WHERE path IN (SELECT path FROM probes ORDER BY last_access ASC LIMIT ?)',
+            (remove,)
+        )
+        self._conn.commit()
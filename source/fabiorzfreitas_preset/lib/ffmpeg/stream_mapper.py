@@ -27,6 +27,9 @@ from logging import Logger
 
 from .probe import Probe
 
+# Number of streams of each type whose copy args are built in advance
+copy_args_cached_streams = 16
+
 
 class StreamMapper(object):
     """
@@ -35,8 +38,6 @@ class StreamMapper(object):
     Manage FFmpeg stream mapping and generating FFmpeg command-line args.
     """
 
-    probe: Probe = None
-
     stream_type_idents = {
         'video':      'v',
         'audio':      'a',
@@ -45,22 +46,19 @@ class StreamMapper(object):
         'attachment': 't'
     }
 
-    processing_stream_type = ''
-    found_streams_to_encode = False
-    stream_mapping = []
-    stream_encoding = []
-    video_stream_count = 0
-    audio_stream_count = 0
-    subtitle_stream_count = 0
-    data_stream_count = 0
-    attachment_stream_count = 0
-
-    input_file = ''
-    output_file = ''
-    generic_options = []
-    main_options = []
-    advanced_options = []
-    format_options = []
+    # Prefixes of the '-map' and '-c' stream specifiers for each stream type
+    stream_type_specifiers = {
+        codec_type: ('0:{}:'.format(ident), '-c:{}:'.format(ident)) for codec_type, ident in stream_type_idents.items()
+    }
+
+    # The '-map' and '-c' args that copy each of the first streams of a type, built once so that mapping a typical
+    # file doesn't format any specifier strings
+    stream_type_copy_args = {
+        codec_type: [
+            (('-map', map_prefix + str(stream_id)), (codec_prefix + str(stream_id), 'copy'))
+            for stream_id in range(copy_args_cached_streams)
+        ] for codec_type, (map_prefix, codec_prefix) in stream_type_specifiers.items()
+    }
 
     def __init__(self, logger: Logger, processing_stream_type: list):
         # Ensure ffmpeg is installed
@@ -68,6 +66,20 @@ class StreamMapper(object):
             raise Exception("Unable to find executable 'ffmpeg'. Please ensure that FFmpeg is installed correctly.")
 
         self.logger = logger
+
+        # All mapping state is held per instance, so separate mappers can be used from different threads
+        self.probe = None
+        self.processing_stream_type = []
+        self.found_streams_to_encode = False
+        self.stream_mapping = []
+        self.stream_encoding = []
+        self.stream_counts = {}
+
+        self.input_file = ''
+        self.output_file = ''
+        self.progress_pipe = False
+        self.format_options = []
+
         if processing_stream_type is not None:
             if any(pst for pst in processing_stream_type if
                    pst not in ['video', 'audio', 'subtitle', 'data', 'attachment']):
@@ -90,25 +102,18 @@ class StreamMapper(object):
             '-max_muxing_queue_size', '4096',
         ]
 
-    def __copy_stream_mapping(self, codec_type, stream_id):
-        """
-        Create stream mapping to simply copy the stream without encoding.
-        Apply this to the 'stream_mapping' and 'stream_encoding' attributes.
-
-        :param codec_type:
-        :param stream_id:
-        :return:
-        """
-        # Map this stream for copy to the destination file
-        self.stream_mapping += ['-map', '0:{}:{}'.format(codec_type, stream_id)]
-        # Add a encoding flag copying this stream
-        self.stream_encoding += ['-c:{}:{}'.format(codec_type, stream_id), 'copy']
+    # Number of streams of each type found by the last mapping. They are read from stream_counts when needed, rather
+    # than set after every mapping.
+    video_stream_count = property(lambda self: self.stream_counts.get('video', 0))
+    audio_stream_count = property(lambda self: self.stream_counts.get('audio', 0))
+    subtitle_stream_count = property(lambda self: self.stream_counts.get('subtitle', 0))
+    data_stream_count = property(lambda self: self.stream_counts.get('data', 0))
+    attachment_stream_count = property(lambda self: self.stream_counts.get('attachment', 0))
 
-    def __apply_custom_stream_mapping(self, mapping_dict):
+    @staticmethod
+    def __validate_custom_stream_mapping(mapping_dict):
         """
-        Apply a custom stream mapping.
-        This method tests that the provided mapping dictionary is valid.
-        If it is valid, apply it to the 'stream_mapping' and 'stream_encoding' attributes.
+        Test that a custom stream mapping dictionary is valid.
 
         :param mapping_dict:
         :return:
@@ -124,10 +129,6 @@ class StreamMapper(object):
             raise Exception("processing_stream_type return dictionary must contain 'stream_encoding' key")
         if not isinstance(mapping_dict.get('stream_encoding'), list):
             raise Exception("processing_stream_type 'stream_mapping' value must be of type 'list'")
-        # Append this custom stream mapping
-        self.stream_mapping += mapping_dict.get('stream_mapping')
-        # Append these custom encoding flags
-        self.stream_encoding += mapping_dict.get('stream_encoding')
 
     def set_probe(self, probe: Probe):
         """Set the ffprobe Probe object"""
@@ -173,17 +174,18 @@ class StreamMapper(object):
 
         # What type of streams are we looking for ('video', 'audio', 'subtitle', 'data' or 'attachment')
         processing_stream_type = self.processing_stream_type
+        stream_type_specifiers = self.stream_type_specifiers
+        stream_type_copy_args = self.stream_type_copy_args
 
-        # Map the streams into two arrays that will be placed together in the correct order.
-        self.stream_mapping = []
-        self.stream_encoding = []
+        # Map the streams into two lists that will be placed together in the correct order.
+        stream_mapping = []
+        stream_encoding = []
+        extend_mapping = stream_mapping.extend
+        extend_encoding = stream_encoding.extend
 
         # Count streams by type
-        self.video_stream_count = 0
-        self.audio_stream_count = 0
-        self.subtitle_stream_count = 0
-        self.data_stream_count = 0
-        self.attachment_stream_count = 0
+        stream_counts = {}
+        copy_unknown = False
 
         # Set flag for finding a stream that needs to be processed as False by default.
         found_streams_to_process = False
@@ -191,146 +193,69 @@ class StreamMapper(object):
         # Loop over all streams found in the file probe
         for stream_info in file_probe_streams:
             codec_type = stream_info.get('codec_type', '').lower()
-            # Fore each of these streams:
-
-            # If this is a video/image stream?
-            if codec_type == "video":
-                # Map the video stream
-                if "video" in processing_stream_type:
-                    if not self.test_stream_needs_processing(stream_info):
-                        self.__copy_stream_mapping('v', self.video_stream_count)
-                        self.video_stream_count += 1
-                        continue
-                    else:
-                        mapping = self.custom_stream_mapping(stream_info, self.video_stream_count)
-                        if mapping:
-                            found_streams_to_process = True
-                            self.__apply_custom_stream_mapping(mapping)
-                        else:
-                            self.__copy_stream_mapping('v', self.video_stream_count)
-                        self.video_stream_count += 1
-                        continue
-                else:
-                    self.__copy_stream_mapping('v', self.video_stream_count)
-                    self.video_stream_count += 1
-                    continue
-
-            # If this is a audio stream?
-            elif codec_type == "audio":
-                # Map the audio stream
-                if "audio" in processing_stream_type:
-                    if not self.test_stream_needs_processing(stream_info):
-                        self.__copy_stream_mapping('a', self.audio_stream_count)
-                        self.audio_stream_count += 1
-                        continue
-                    else:
-                        mapping = self.custom_stream_mapping(stream_info, self.audio_stream_count)
-                        if mapping:
-                            found_streams_to_process = True
-                            self.__apply_custom_stream_mapping(mapping)
-                        else:
-                            self.__copy_stream_mapping('a', self.audio_stream_count)
-                        self.audio_stream_count += 1
-                        continue
-                else:
-                    self.__copy_stream_mapping('a', self.audio_stream_count)
-                    self.audio_stream_count += 1
+            stream_id = stream_counts.get(codec_type, 0)
+            stream_counts[codec_type] = stream_id + 1
+
+            copy_args = stream_type_copy_args.get(codec_type)
+            if copy_args is None:
+                # Streams of an unknown type have no stream specifier and can't be encoded.
+                # Map them by their index and let FFmpeg copy them.
+                stream_index = stream_info.get('index')
+                if stream_index is not None:
+                    extend_mapping(('-map', '0:{}'.format(stream_index)))
+                    copy_unknown = True
+                continue
+
+            if codec_type in processing_stream_type and self.test_stream_needs_processing(stream_info):
+                mapping = self.custom_stream_mapping(stream_info, stream_id)
+                if mapping:
+                    found_streams_to_process = True
+                    self.__validate_custom_stream_mapping(mapping)
+                    extend_mapping(mapping.get('stream_mapping'))
+                    extend_encoding(mapping.get('stream_encoding'))
                     continue
 
-            # If this is a subtitle stream?
-            elif codec_type == "subtitle":
-                # Map the subtitle stream
-                if "subtitle" in processing_stream_type:
-                    if not self.test_stream_needs_processing(stream_info):
-                        self.__copy_stream_mapping('s', self.subtitle_stream_count)
-                        self.subtitle_stream_count += 1
-                        continue
-                    else:
-                        mapping = self.custom_stream_mapping(stream_info, self.subtitle_stream_count)
-                        if mapping:
-                            found_streams_to_process = True
-                            self.__apply_custom_stream_mapping(mapping)
-                        else:
-                            self.__copy_stream_mapping('s', self.subtitle_stream_count)
-                        self.subtitle_stream_count += 1
-                        continue
-                else:
-                    self.__copy_stream_mapping('s', self.subtitle_stream_count)
-                    self.subtitle_stream_count += 1
-                    continue
+            # Map this stream for copy to the destination file
+            if stream_id < copy_args_cached_streams:
+                mapping_args, encoding_args = copy_args[stream_id]
+            else:
+                specifiers = stream_type_specifiers[codec_type]
+                mapping_args = ('-map', specifiers[0] + str(stream_id))
+                encoding_args = (specifiers[1] + str(stream_id), 'copy')
+            extend_mapping(mapping_args)
+            extend_encoding(encoding_args)
 
-            # If this is a data stream?
-            elif codec_type == "data":
-                # Map the data stream
-                if "data" in processing_stream_type:
-                    if not self.test_stream_needs_processing(stream_info):
-                        self.__copy_stream_mapping('d', self.data_stream_count)
-                        self.data_stream_count += 1
-                        continue
-                    else:
-                        mapping = self.custom_stream_mapping(stream_info, self.data_stream_count)
-                        if mapping:
-                            found_streams_to_process = True
-                            self.__apply_custom_stream_mapping(mapping)
-                        else:
-                            self.__copy_stream_mapping('d', self.data_stream_count)
-                        self.data_stream_count += 1
-                        continue
-                else:
-                    self.__copy_stream_mapping('d', self.data_stream_count)
-                    self.data_stream_count += 1
-                    continue
+        if copy_unknown:
+            stream_encoding.append('-copy_unknown')
 
-            # If this is a attachment stream?
-            elif codec_type == "attachment":
-                # Map the attachment stream
-                if "attachment" in processing_stream_type:
-                    if not self.test_stream_needs_processing(stream_info):
-                        self.__copy_stream_mapping('t', self.attachment_stream_count)
-                        self.attachment_stream_count += 1
-                        continue
-                    else:
-                        mapping = self.custom_stream_mapping(stream_info, self.attachment_stream_count)
-                        if mapping:
-                            found_streams_to_process = True
-                            self.__apply_custom_stream_mapping(mapping)
-                        else:
-                            self.__copy_stream_mapping('t', self.attachment_stream_count)
-                        self.attachment_stream_count += 1
-                        continue
-                else:
-                    self.__copy_stream_mapping('t', self.attachment_stream_count)
-                    self.attachment_stream_count += 1
-                    continue
+        self.stream_mapping = stream_mapping
+        self.stream_encoding = stream_encoding
+        self.stream_counts = stream_counts
 
         return found_streams_to_process
 
-    def __build_args(self, options: list, *args, **kwargs):
+    @staticmethod
+    def __build_args(options: list, *args, **kwargs):
         """
-        Build a list of FFmpeg options based on the given default options, args and kwargs
+        Build a list of FFmpeg options based on the given default options, args and kwargs.
+        The given options are not modified, a new list is returned.
 
         :param options:
         :param args:
         :param kwargs:
         :return:
         """
+        options = list(options)
         for arg in args:
             if arg in options:
                 options = [value for value in options if value != arg]
-                options += [arg]
-            else:
-                options += [arg]
-        for kwarg in kwargs:
-            key = kwarg
-            value = kwargs.get(kwarg)
+            options.append(arg)
+        for key, value in kwargs.items():
             if key in options:
-                key_pos = options.index(key)
-                val_pos = int(key_pos) + 1
-                options[key_pos] = key
-                options[val_pos] = value
+                options[options.index(key) + 1] = value
             else:
                 options += [key, value]
-        return
+        return options
 
     def streams_need_processing(self):
         """
@@ -373,7 +298,18 @@ class StreamMapper(object):
         main_options = {
             "-f": 'null',
         }
-        self.__build_args(self.main_options, **main_options)
+        self.main_options = self.__build_args(self.main_options, **main_options)
+
+    def set_progress_pipe(self, enabled: bool = True):
+        """
+        Have FFmpeg write machine-readable progress blocks to stdout ('-progress pipe:1') and
+        disable the periodic stats line ('-nostats').
+        The Parser class is able to read either format.
+
+        :param enabled:
+        :return:
+        """
+        self.progress_pipe = enabled
 
     def set_ffmpeg_generic_options(self, *args, **kwargs):
         """
@@ -388,7 +324,7 @@ class StreamMapper(object):
         :param kwargs:
         :return:
         """
-        self.__build_args(self.generic_options, *args, **kwargs)
+        self.generic_options = self.__build_args(self.generic_options, *args, **kwargs)
 
     def set_ffmpeg_main_options(self, *args, **kwargs):
         """
@@ -401,7 +337,7 @@ class StreamMapper(object):
 
         :return:
         """
-        self.__build_args(self.main_options, *args, **kwargs)
+        self.main_options = self.__build_args(self.main_options, *args, **kwargs)
 
     def set_ffmpeg_advanced_options(self, *args, **kwargs):
         """
@@ -420,7 +356,7 @@ class StreamMapper(object):
 
         :return:
         """
-        self.__build_args(self.advanced_options, *args, **kwargs)
+        self.advanced_options = self.__build_args(self.advanced_options, *args, **kwargs)
 
     def get_stream_mapping(self):
         """
@@ -454,6 +390,8 @@ class StreamMapper(object):
 
         # Add generic options first
         args += self.generic_options
+        if self.progress_pipe:
+            args += ['-progress', 'pipe:1', '-nostats']
 
         # Add other main options
         args += self.main_options
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.mapper.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 16:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import logging
+
+from fabiorzfreitas_preset.lib.ffmpeg import ProbeResult, StreamMapper
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+
+class PresetStreamMapper(StreamMapper):
+    """
+    Stream mapping for the preset.
+
+    Keeps the first video stream, transcoded to x264 or copied, followed by every audio stream. When the first audio
+    stream is not ac3, an ac3 copy of it is added as the first audio stream and the remaining audio streams are moved
+    up by one. Subtitle, data and attachment streams are left out with their -map, so they need no extra options.
+    With a video_input_file, the video stream is copied from that file instead, e.g. a video stream that was already
+    encoded in segments. Every other stream is still read from the input file.
+    """
+
+    def __init__(self, transcode_video: bool = False, prepend_ac3: bool = False, video_encoder_args: list = None,
+                 video_input_file: str = None):
+        super(PresetStreamMapper, self).__init__(logger, ['video', 'audio', 'subtitle', 'data', 'attachment'])
+        self.transcode_video = transcode_video
+        self.prepend_ac3 = prepend_ac3
+        self.video_encoder_args = video_encoder_args or []
+
+        # The video input follows the input file, so it must come before any of the advanced (output) options
+        self.video_input: int = 0
+        if video_input_file:
+            self.transcode_video = False
+            self.advanced_options = ['-i', video_input_file] + self.advanced_options
+            self.video_input = 1
+
+        # Strips global metadata and chapters from the output
+        self.set_ffmpeg_advanced_options(**{'-map_metadata': '-1', '-map_chapters': '-1'})
+
+    def set_probe_result(self, probe_result: ProbeResult):
+        """
+        Sets the streams to map from a ProbeResult.
+        Video streams are listed first, so the output always starts with the video stream.
+        Streams of unknown types are left out.
+        """
+
+        streams: list = []
+        other_types: list = [t for t in self.stream_type_idents if t not in ('video', 'audio')]
+        for codec_type in ['video', 'audio'] + other_types:
+            for stream in probe_result.streams_of_type(codec_type):
+                streams.append({
+                    'index':      stream.index,
+                    'codec_type': stream.codec_type,
+                    'codec_name': stream.codec_name,
+                })
+
+        self.set_probe({'streams': streams})
+
+    def test_stream_needs_processing(self, stream_info: dict):
+        codec_type: str = stream_info.get('codec_type', '').lower()
+
+        # Audio streams are only copied as they are when no ac3 stream is added in front of them
+        if codec_type == 'audio':
+            return self.prepend_ac3
+
+        return True
+
+    def custom_stream_mapping(self, stream_info: dict, stream_id: int):
+        codec_type: str = stream_info.get('codec_type', '').lower()
+
+        if codec_type == 'video' and stream_id == 0:
+            if self.transcode_video:
+                stream_encoding: list = ['-c:v:0', 'libx264'] + self.video_encoder_args
+            else:
+                stream_encoding: list = ['-c:v:0', 'copy']
+            return {
+                'stream_mapping':  ['-map', f'{self.video_input}:v:0'],
+                'stream_encoding': stream_encoding,
+            }
+
+        if codec_type == 'audio':
+            if stream_id == 0:
+                return {
+                    'stream_mapping':  ['-map', '0:a:0', '-map', '0:a:0'],
+                    'stream_encoding': ['-c:a:0', 'ac3', '-c:a:1', 'copy'],
+                }
+            return {
+                'stream_mapping':  ['-map', f'0:a:{stream_id}'],
+                'stream_encoding': [f'-c:a:{stream_id + 1}', 'copy'],
+            }
+
+        # Any other stream is left out of the output
+        return {
+            'stream_mapping':  [],
+            'stream_encoding': [],
+        }
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.metrics.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 19:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+# Output formats of the metrics file written to the plugin profile directory
+metrics_formats: dict = {
+    'none':       'Disabled',
+    'prometheus': 'Prometheus textfile (metrics.prom)',
+    'json_lines': 'JSON lines (metrics.jsonl)',
+}
+metrics_file_names: dict = {
+    'prometheus': 'metrics.prom',
+    'json_lines': 'metrics.jsonl',
+}
+
+metric_prefix: str = 'fabiorzfreitas_preset'
+
+# Metric name: (type, help text)
+metric_definitions: dict = {
+    'runner_seconds':             ('histogram', 'Time spent in each plugin runner'),
+    'probe_seconds':              ('histogram', 'Time spent running ffprobe'),
+    'probes_total':               ('counter', 'File probes, by result'),
+    'files_tested_total':         ('counter', 'Files tested, by result'),
+    'rule_fired_total':           ('counter', 'Rules that fired in file tests, by rule'),
+    'ffmpeg_seconds':             ('histogram', 'FFmpeg run time from its first to its last progress line, by work type'),
+    'ffmpeg_media_seconds_total': ('counter', 'Seconds of media processed by FFmpeg, by work type'),
+    'ffmpeg_frames_total':        ('counter', 'Frames processed by FFmpeg, by work type'),
+    'ffmpeg_speed':               ('histogram', 'Speed reported by FFmpeg at the end of a run, by work type'),
+    'ffmpeg_bitrate_kbps':        ('histogram', 'Output bitrate reported by FFmpeg at the end of a run, by work type'),
+    'move_seconds':               ('histogram', 'Time spent moving the output file into place, by method'),
+}
+
+# Upper bounds of the histogram buckets, in seconds. They cover a cached probe up to a long transcode.
+histogram_buckets: tuple = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600, 7200, 14400)
+
+# Upper bounds of the buckets of the histograms that don't measure seconds
+metric_buckets: dict = {
+    'ffmpeg_speed':        (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+    'ffmpeg_bitrate_kbps': (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+}
+
+# Matches the bitrate reported by the Parser, e.g. '2523.1kbits/s'
+bitrate_regex = re.compile(r'\s*(\d+(?:\.\d+)?)kbits/s')
+
+# Minimum number of seconds between writes of the metrics file
+flush_interval: int = 15
+
+# Size at which the JSON lines file is renamed to metrics.jsonl.1, replacing the previous one,
+# so it takes at most twice this size on disk
+max_json_lines_bytes: int = 10 * 1024 * 1024
+
+# Counters and histograms are keyed by (metric name, sorted label items)
+counters: dict = {}
+histograms: dict = {}
+metrics_lock = threading.Lock()
+
+# Serialises writes of the metrics file, so a rotation never races an append
+flush_lock = threading.Lock()
+
+# Where the metrics are written, set from the plugin settings by configure()
+metrics_target: dict = {
+    'directory': None,
+    'format':    'none',
+    'last_flush': 0.0,
+}
+
+
+def get_buckets(name: str) -> tuple:
+    return metric_buckets.get(name, histogram_buckets)
+
+
+def get_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """
+    Adds the value to a counter
+    """
+
+    key: tuple = get_key(name, labels)
+    with metrics_lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    Records a value in a histogram
+    """
+
+    key: tuple = get_key(name, labels)
+    with metrics_lock:
+        buckets: tuple = get_buckets(name)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for position, upper_bound in enumerate(buckets):
+            if value <= upper_bound:
+                histogram['buckets'][position] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def timed_runner(runner_name: str):
+    """
+    Decorator that records the time spent in a plugin runner and writes the metrics file once it returns
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe('runner_seconds', time.perf_counter() - start, runner=runner_name)
+                flush()
+        return wrapper
+    return decorator
+
+
+def record_probe(probe) -> None:
+    """
+    Records the ffprobe time of a probe, or a cache hit
+    """
+
+    if probe.probe_stats.get('cached'):
+        inc('probes_total', result='cached')
+    elif 'probe_seconds' in probe.probe_stats:
+        inc('probes_total', result='probed')
+        observe('probe_seconds', probe.probe_stats['probe_seconds'])
+
+
+def record_decision(decision) -> None:
+    """
+    Records the result of a file test and the rules that fired
+    """
+
+    inc('files_tested_total', result='queued' if decision.needs_processing else 'skipped')
+    for rule_name in decision.fired:
+        inc('rule_fired_total', rule=rule_name)
+
+
+class ProgressRecorder(object):
+    """
+    Wraps the parse_progress() function of a Parser to record the FFmpeg run time and throughput of a task.
+    The run is recorded once the Parser reports 100 percent, along with the last speed and bitrate it read.
+    """
+
+    def __init__(self, parser, work_type: str, duration: float = None):
+        self.parser = parser
+        self.work_type: str = work_type
+        self.duration: float = duration
+        self.start: float = None
+        self.recorded: bool = False
+
+    def parse_progress(self, line_text):
+        progress: dict = self.parser.parse_progress(line_text)
+        if self.recorded:
+            return progress
+
+        now: float = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        if str(progress.get('percent')) == '100':
+            self.recorded = True
+            observe('ffmpeg_seconds', now - self.start, work_type=self.work_type)
+            if self.duration:
+                inc('ffmpeg_media_seconds_total', self.duration, work_type=self.work_type)
+            if str(self.parser.frame).isdigit():
+                inc('ffmpeg_frames_total', int(self.parser.frame), work_type=self.work_type)
+            self.record_speed_and_bitrate()
+
+        return progress
+
+    def record_speed_and_bitrate(self):
+        # The Parser leaves them at '0' when FFmpeg didn't report them, e.g. for segmented encodes
+        try:
+            speed: float = float(str(self.parser.speed).rstrip('x'))
+        except ValueError:
+            speed = 0.0
+        if speed > 0:
+            observe('ffmpeg_speed', speed, work_type=self.work_type)
+
+        match = bitrate_regex.match(str(self.parser.bitrate))
+        if match and float(match.group(1)) > 0:
+            observe('ffmpeg_bitrate_kbps', float(match.group(1)), work_type=self.work_type)
+
+
+def configure(directory: str, metrics_format: str) -> None:
+    """
+    Sets the directory and format of the metrics file
+    """
+
+    with metrics_lock:
+        metrics_target['directory'] = directory
+        metrics_target['format'] = metrics_format if metrics_format in metrics_file_names else 'none'
+
+
+def get_snapshot() -> dict:
+    """
+    Returns a copy of every counter and histogram
+    """
+
+    with metrics_lock:
+        return {
+            'counters':   [{'name': name, 'labels': dict(labels), 'value': value}
+                           for (name, labels), value in sorted(counters.items())],
+            'histograms': [{'name': name, 'labels': dict(labels), 'bounds': list(get_buckets(name)),
+                            'buckets': list(histogram['buckets']), 'sum': histogram['sum'], 'count': histogram['count']}
+                           for (name, labels), histogram in sorted(histograms.items())],
+        }
+
+
+def format_labels(labels: dict, **extra_labels) -> str:
+    labels = dict(labels, **extra_labels)
+    if not labels:
+        return ''
+    label_values: list = []
+    for key, value in labels.items():
+        escaped_value: str = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        label_values.append(f'{key}="{escaped_value}"')
+    return '{' + ','.join(label_values) + '}'
+
+
+def format_prometheus(snapshot: dict) -> str:
+    """
+    Returns the snapshot in the Prometheus text exposition format
+    """
+
+    lines: list = []
+    for name, (metric_type, help_text) in metric_definitions.items():
+        metric_name: str = f'{metric_prefix}_{name}'
+        lines += [f'# HELP {metric_name} {help_text}', f'# TYPE {metric_name} {metric_type}']
+
+        if metric_type == 'counter':
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(f"{metric_name}{format_labels(counter['labels'])} {counter['value']}")
+            continue
+
+        for histogram in snapshot['histograms']:
+            if histogram['name'] != name:
+                continue
+            labels: dict = histogram['labels']
+            cumulative_count: int = 0
+            for upper_bound, bucket_count in zip(histogram['bounds'], histogram['buckets']):
+                cumulative_count += bucket_count
+                lines.append(f"{metric_name}_bucket{format_labels(labels, le=upper_bound)} {cumulative_count}")
+            lines.append(f"{metric_name}_bucket{format_labels(labels, le='+Inf')} {histogram['count']}")
+            lines.append(f"{metric_name}_sum{format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{metric_name}_count{format_labels(labels)} {histogram['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def flush(force: bool = False) -> None:
+    """
+    Writes the metrics file, at most once every 'flush_interval' seconds unless forced.
+    The Prometheus textfile is replaced as a whole, the JSON lines file gets a snapshot line appended and is rotated
+    once it reaches 'max_json_lines_bytes'.
+    """
+
+    with metrics_lock:
+        directory: str = metrics_target['directory']
+        metrics_format: str = metrics_target['format']
+        now: float = time.monotonic()
+        if not directory or metrics_format == 'none':
+            return
+        if not force and now - metrics_target['last_flush'] < flush_interval:
+            return
+        metrics_target['last_flush'] = now
+
+    snapshot: dict = get_snapshot()
+    file_path: str = os.path.join(directory, metrics_file_names[metrics_format])
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with flush_lock:
+            if metrics_format == 'prometheus':
+                # node_exporter may read the file at any time, so it's replaced in one rename
+                temp_path: str = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(format_prometheus(snapshot))
+                os.replace(temp_path, file_path)
+            else:
+                snapshot['time'] = time.time()
+                snapshot['histogram_buckets'] = list(histogram_buckets)
+                if os.path.exists(file_path) and os.path.getsize(file_path) >= max_json_lines_bytes:
+                    os.replace(file_path, f'{file_path}.1')
+                with open(file_path, 'a') as f:
+                    f.write(json.dumps(snapshot, separators=(',', ':')) + '\n')
+    except OSError as e:
+        logger.debug(f'Unable to write the metrics file {file_path}: {e}')
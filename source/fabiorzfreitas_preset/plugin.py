@@ -30,29 +30,348 @@
 
 """
 
+import hashlib
 import logging
+import threading
+import time
 
 import os
-from fabiorzfreitas_preset.lib.ffmpeg import Probe, Parser
+from collections import OrderedDict
+from unmanic.libs.unplugins.settings import PluginSettings
+
+from fabiorzfreitas_preset import cost, dirindex, encoder, eventlog, fileops, metrics, prefilter, rules, segment
+from fabiorzfreitas_preset.lib.ffmpeg import Probe, ProbeCache, ProbeEnvironment, Parser
 
 # Configures plugin logger
 logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
 
-# Formats logger output
-def logger_output(line: str):
+
+class Settings(PluginSettings):
+    settings = {
+        'probe_cache_enabled':     True,
+        'probe_cache_max_entries': ProbeCache.default_max_entries,
+        'probe_prefetch_directory': False,
+        'probe_concurrency':       4,
+        'directory_index_enabled': True,
+        'ffmpeg_progress_pipe':    True,
+        'encoder_profile':         'balanced',
+        'encoder_worker_count':    1,
+        'segment_encoding':        False,
+        'segment_count':           4,
+        'scratch_directory':       '',
+        'postprocessor_move_file': False,
+        'single_pass_remux':       True,
+        'priority_order':          'shortest_first',
+        'metrics_format':          'none',
+        'log_format':              'text',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super(Settings, self).__init__(*args, **kwargs)
+        self.form_settings = {
+            'probe_cache_enabled':     {
+                'label': 'Cache FFprobe results between library scans',
+            },
+            'probe_cache_max_entries': self.__set_probe_cache_max_entries_form_settings(),
+            'probe_prefetch_directory': self.__set_probe_prefetch_directory_form_settings(),
+            'probe_concurrency':       self.__set_probe_concurrency_form_settings(),
+            'directory_index_enabled': {
+                'label': "Skip files already tested in directories that haven't changed since the last library scan",
+            },
+            'ffmpeg_progress_pipe':    {
+                'label': 'Report FFmpeg progress with machine-readable progress blocks (-progress pipe:1)',
+            },
+            'encoder_profile':         self.__set_encoder_profile_form_settings(),
+            'encoder_worker_count':    self.__set_encoder_worker_count_form_settings(),
+            'segment_encoding':        {
+                'label': 'Split long files at keyframes and encode the segments in parallel FFmpeg processes',
+            },
+            'segment_count':           self.__set_segment_count_form_settings(),
+            'scratch_directory':       {
+                'label': 'Scratch directory for the cache file, e.g. a local SSD or tmpfs (leave empty to write it next to the source file)',
+            },
+            'postprocessor_move_file': {
+                'label': 'Move the processed file into place (rename, reflink or in-kernel copy) instead of letting Unmanic copy it. '
+                         'Only enable this when no other plugin runs after this one in the post-processor',
+            },
+            'single_pass_remux':       {
+                'label': 'Remux files that are not .mkv and apply every other change in a single FFmpeg run',
+            },
+            'priority_order':          self.__set_priority_order_form_settings(),
+            'metrics_format':          self.__set_metrics_format_form_settings(),
+            'log_format':              self.__set_log_format_form_settings(),
+        }
+
+    def __set_probe_cache_max_entries_form_settings(self):
+        values = {
+            'label':          'Maximum number of files kept in the FFprobe cache',
+            'input_type':     'slider',
+            'slider_options': {
+                'min':  10000,
+                'max':  1000000,
+                'step': 10000,
+            },
+        }
+        if not self.get_setting('probe_cache_enabled'):
+            values['display'] = 'hidden'
+        return values
+
+    def __set_probe_prefetch_directory_form_settings(self):
+        values = {
+            'label': 'Probe the rest of the directory in one batch when a file is not cached',
+        }
+        if not self.get_setting('probe_cache_enabled'):
+            values['display'] = 'hidden'
+        return values
+
+    def __set_probe_concurrency_form_settings(self):
+        values = {
+            'label':          'Number of FFprobe processes run at once per storage device',
+            'input_type':     'slider',
+            'slider_options': {
+                'min': 1,
+                'max': 32,
+            },
+        }
+        if not self.get_setting('probe_cache_enabled') or not self.get_setting('probe_prefetch_directory'):
+            values['display'] = 'hidden'
+        return values
+
+    def __set_encoder_profile_form_settings(self):
+        values = {
+            'label':          'x264 encoder profile used when the video stream is not x264',
+            'input_type':     'select',
+            'select_options': [],
+        }
+        for profile_name, profile in encoder.encoder_profiles.items():
+            values['select_options'].append({
+                'value': profile_name,
+                'label': profile['label'],
+            })
+        return values
+
+    def __set_encoder_worker_count_form_settings(self):
+        values = {
+            'label':          'Number of Unmanic workers sharing the CPUs (each encode gets an equal share of threads)',
+            'input_type':     'slider',
+            'slider_options': {
+                'min': 1,
+                'max': 32,
+            },
+        }
+        return values
+
+    def __set_segment_count_form_settings(self):
+        values = {
+            'label':          'Maximum number of segments encoded at once for a single file',
+            'input_type':     'slider',
+            'slider_options': {
+                'min': 2,
+                'max': 32,
+            },
+        }
+        if not self.get_setting('segment_encoding'):
+            values['display'] = 'hidden'
+        return values
+
+    def __set_priority_order_form_settings(self):
+        values = {
+            'label':          'Order of new tasks in the queue, from the estimated work of each file',
+            'input_type':     'select',
+            'select_options': [],
+        }
+        for priority_order, label in cost.priority_orders.items():
+            values['select_options'].append({
+                'value': priority_order,
+                'label': label,
+            })
+        return values
+
+    def __set_metrics_format_form_settings(self):
+        values = {
+            'label':          'Write timing and throughput metrics to the plugin profile directory',
+            'input_type':     'select',
+            'select_options': [],
+        }
+        for metrics_format, label in metrics.metrics_formats.items():
+            values['select_options'].append({
+                'value': metrics_format,
+                'label': label,
+            })
+        return values
+
+    def __set_log_format_form_settings(self):
+        values = {
+            'label':          'Format of the plugin log messages',
+            'input_type':     'select',
+            'select_options': [],
+        }
+        for log_format, label in eventlog.log_formats.items():
+            values['select_options'].append({
+                'value': log_format,
+                'label': label,
+            })
+        return values
+
+
+def get_probe_cache(settings: Settings):
     """
-    Simple function to make the logger output more readable
+    Returns the persistent FFprobe cache stored in the plugin profile directory, or None if disabled
     """
 
-    line_len:str  = '-' * len(line)
+    if not settings.get_setting('probe_cache_enabled'):
+        return None
 
-    logger.debug(line_len)
-    logger.debug(line)
-    logger.debug(line_len)
+    db_path: str = os.path.join(settings.get_profile_directory(), 'probe_cache.db')
 
-    return
+    return ProbeCache.open(db_path, max_entries=int(settings.get_setting('probe_cache_max_entries')))
+
+
+# Hash of the files that decide the file test verdicts, set by get_verdict_fingerprint()
+verdict_fingerprint: str = ''
+
+
+def get_verdict_fingerprint() -> str:
+    """
+    Returns a hash of the plugin's info.json and of the rules and pre-filter modules, so that a plugin update that
+    changes how files are tested drops the verdicts recorded in the directory index
+    """
+
+    global verdict_fingerprint
+    if not verdict_fingerprint:
+        fingerprint_hash = hashlib.sha1()
+        for file_path in (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'info.json'), rules.__file__,
+                          prefilter.__file__):
+            with open(file_path, 'rb') as f:
+                fingerprint_hash.update(f.read())
+        verdict_fingerprint = fingerprint_hash.hexdigest()
+
+    return verdict_fingerprint
+
+
+def get_directory_index(settings: Settings):
+    """
+    Returns the directory index stored in the plugin profile directory, or None if disabled
+    """
+
+    if not settings.get_setting('directory_index_enabled'):
+        return None
 
+    return dirindex.DirectoryIndex.open(os.path.join(settings.get_profile_directory(), 'directory_index.db'),
+                                        fingerprint=get_verdict_fingerprint())
 
+
+def invalidate_directory_index(path: str, library_id: int = None) -> None:
+    """
+    Removes the directory index entries of a directory and everything below it, so their files are tested again
+    on the next library scan
+    """
+
+    directory_index = get_directory_index(Settings(library_id=library_id))
+    if directory_index is not None:
+        directory_index.invalidate_subtree(path)
+
+
+def record_verdict(directory_index, abspath: str, verdict: str, directory_key: int) -> None:
+    """
+    Records the file test verdict of a file in the directory index, if enabled
+    """
+
+    if directory_index is not None:
+        directory_index.set_verdict(abspath, verdict, directory_key)
+
+
+# Prefetches in progress, by directory. File tests in a directory being prefetched wait for the prefetch to finish,
+# so they read their probe from the cache instead of probing the file a second time.
+prefetching_directories: dict = {}
+prefetching_directories_lock = threading.Lock()
+
+# Modification time (ns) of the most recently prefetched directories when they were prefetched.
+# A directory is only prefetched again once its contents have changed.
+prefetched_directories: OrderedDict = OrderedDict()
+max_prefetched_directories: int = 1024
+
+
+def prefetch_directory_probes(abspath: str, settings: Settings, probe_cache: ProbeCache) -> None:
+    """
+    Probes the files of the tested file's directory in one concurrent batch and stores them in the probe cache,
+    so the file tests for the rest of the directory don't each need to spawn ffprobe
+    """
+
+    if probe_cache is None or not settings.get_setting('probe_prefetch_directory'):
+        return
+
+    directory: str = os.path.dirname(abspath)
+    try:
+        directory_mtime_ns: int = os.stat(directory).st_mtime_ns
+    except OSError:
+        return
+
+    with prefetching_directories_lock:
+        if prefetched_directories.get(directory) == directory_mtime_ns:
+            prefetched_directories.move_to_end(directory)
+            return
+        prefetch_done = prefetching_directories.get(directory)
+        in_progress: bool = prefetch_done is not None
+        if not in_progress:
+            prefetch_done = prefetching_directories[directory] = threading.Event()
+    if in_progress:
+        prefetch_done.wait()
+        return
+
+    try:
+        # Only prefetch when this file isn't cached, which means the directory is new or has changed
+        if probe_cache.get(abspath, profile='lean') is not None:
+            return
+
+        paths: list = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not prefilter.run(entry.path, count=False):
+                    paths.append(entry.path)
+
+        concurrency: int = int(settings.get_setting('probe_concurrency'))
+        probed_count: int = 0
+        probes = Probe.probe_many(paths, logger, allowed_mimetypes=['video'], cache=probe_cache, profile='lean',
+                                  max_workers=concurrency, max_workers_per_mount=concurrency)
+        for _, probe in probes:
+            if probe:
+                probed_count += 1
+                metrics.record_probe(probe)
+
+        eventlog.log_event('prefetch_done', directory=directory, probed_count=probed_count, file_count=len(paths))
+
+        with prefetching_directories_lock:
+            prefetched_directories[directory] = directory_mtime_ns
+            prefetched_directories.move_to_end(directory)
+            while len(prefetched_directories) > max_prefetched_directories:
+                prefetched_directories.popitem(last=False)
+
+    except OSError:
+        eventlog.log_event('prefetch_failed', directory=directory)
+
+    finally:
+        with prefetching_directories_lock:
+            del prefetching_directories[directory]
+        prefetch_done.set()
+
+
+def get_task_decision(abspath: str, probe: Probe, cache: ProbeCache) -> rules.Decision:
+    """
+    Returns the decision stored by the file test for this file.
+    The cache only returns it while the file's size and mtime match the probe it was made from,
+    otherwise the rules are evaluated again against the probe.
+    """
+
+    if cache is not None:
+        annotations = cache.get_annotations(abspath)
+        if annotations and 'decision' in annotations:
+            return rules.Decision.from_dict(annotations['decision'])
+
+    return rules.evaluate(abspath, probe.get_result())
+
+
+@metrics.timed_runner('file_test')
 def on_library_management_file_test(data: dict) -> None:
     """
     Runner function - enables additional actions during the library management file tests.
@@ -69,160 +388,90 @@ def on_library_management_file_test(data: dict) -> None:
     
     # Sets working path
     abspath: str = data['path']
+    settings = Settings(library_id=data.get('library_id'))
+    metrics.configure(settings.get_profile_directory(), settings.get_setting('metrics_format'))
+    eventlog.configure(settings.get_setting('log_format'))
 
-    testing_line: str = f'[TESTING] Testing file {abspath}'
-    logger_output(testing_line)
+    eventlog.log_event('test_started', path=abspath)
 
-    # Skips cache files
-    if os.path.basename(abspath).split('.')[-2] == 'cache':
-        
-        cache_line: str = f'[TESTING] File {abspath} is cache, skipping'
-        logger_output(cache_line)
-        
-        data['add_file_to_pending_tasks'] = False
+    # Skips files that were already tested and skipped, as long as neither they nor their directory have changed.
+    # The directory's mtime is read before the test, so changes made while testing are not recorded as unchanged.
+    directory_index = get_directory_index(settings)
+    directory_key = None
+    if directory_index is not None:
+        directory_key = directory_index.directory_key(os.path.dirname(abspath))
+        if directory_index.get_verdict(abspath, directory_key=directory_key) == 'skip':
 
-        return
+            eventlog.log_event('test_indexed', path=abspath)
 
-    # Skips .part files
-    if os.path.splitext(abspath)[1] == '.part':
-        
-        part_line: str = f'[TESTING] File {abspath} extension is .part, skipping'
-        logger_output(part_line)
-        
-        data['add_file_to_pending_tasks'] = False
+            data['add_file_to_pending_tasks'] = False
+            metrics.inc('files_tested_total', result='indexed')
 
-        return
-
-    # Gets file probe
-    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'])
-    if not probe:
-        # File not able to be probed by ffprobe
-        return
+            return
 
-    ffprobe_data: dict = probe.get_probe()
+    # Runs the pre-filter stages before spawning ffprobe
+    prefilter_result = prefilter.run(abspath)
+    if prefilter_result:
 
-    # Defines paths and shared_info
-    shared_info: dict = {}
-    source_dirpath: str = f"{os.path.split(data['path'])[0]}"
-    source_dirpath_replaced: str = source_dirpath.replace('\\', '/')
-    show_dir: str = source_dirpath_replaced.split('/')[-2]
-    basename: str= f"{os.path.split(data['path'])[1]}"
+        stage_name, reason, skip_file = prefilter_result
 
-    # Tests if file is already in Optimized folder
-    if show_dir == 'Optimized for TV' or os.path.exists(f'{source_dirpath_replaced}/Plex Versions/Optimized for TV/{show_dir}/{basename}'):
+        eventlog.log_event('test_prefiltered', path=abspath, stage=stage_name, reason=reason)
+        if eventlog.is_enabled('prefilter_counters'):
+            eventlog.log_event('prefilter_counters', counters=prefilter.get_counters())
 
-        optimized_line: str = f'[TESTING] File {abspath} already has been optimized, skipping'
-        logger_output(optimized_line)
-        
-        data['add_file_to_pending_tasks'] = False
+        if skip_file:
+            data['add_file_to_pending_tasks'] = False
+            if stage_name not in prefilter.external_stages:
+                record_verdict(directory_index, abspath, 'skip', directory_key)
+        metrics.inc('files_tested_total', result='prefiltered')
 
         return
-    
-    # Tests if container is .mkv
-    # A second pass will be needed if this matches
-    if os.path.splitext(abspath)[1] != '.mkv':
-
-        testing_mkv_line: str = f'[TESTING] File {abspath} container is not .mkv, adding to queue'
-        logger_output(testing_mkv_line)
-
-        data['add_file_to_pending_tasks'] = True
-        shared_info['container_is_not_mkv'] = True
 
+    # Gets file probe
+    probe_cache = get_probe_cache(settings)
+    prefetch_directory_probes(abspath, settings, probe_cache)
+    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'], cache=probe_cache, profile='lean')
+    if not probe:
+        # File not able to be probed by ffprobe
         return
 
-    # Checks the first video stream for x264
-    for stream in ffprobe_data['streams']:
-        
-        if stream['codec_type'] == 'video' and stream['codec_name'] != 'h264':
-
-            testing_x264_line: str = f'[TESTING] File {abspath} video stream is not x264, adding to queue'
-            logger_output(testing_x264_line)
-
-            shared_info['non_h264'] = True
-            # This function doesn't return yet, as the file still needs to be checked for audio
-
-    # Checks if the video stream is the first stream
-    if ffprobe_data['streams'][0]['codec_type'] != 'video':
-        
-        testing_video_0_line: str = f'[TESTING] File {abspath} does not have video as the first stream, adding to queue'
-        logger_output(testing_video_0_line)
-        
-        data['add_file_to_pending_tasks'] = True
-        
-        for stream in ffprobe_data['streams']:
-            if stream['codec_type'] == 'video':
-                shared_info['non_0_video_stream'] = True
-                shared_info['video_stream_index'] = stream['index']
-                
-                break
-                # This function doesn't return yet, as the file still needs to be checked for audio
-
-    # Checks if first audio stream is ac3
-    if ffprobe_data['streams'][1]['codec_type'] == 'audio' and ffprobe_data['streams'][1]['codec_name'] != 'ac3':
-        
-        testing_ac3_line: str = f'[TESTING] File {abspath} does not have ac3 as the first audio stream, adding to queue'
-        logger_output(testing_ac3_line)
-
-        data['add_file_to_pending_tasks'] = True
-        shared_info['first_audio_is_not_ac3'] = True
-        
-        return
-    
-    # Checks if there are chapters
-    if ffprobe_data['chapters'] != []:
-
-        testing_chapters_line: str = f'[TESTING] File {abspath} has chapters, processing'
-        logger_output(testing_chapters_line)
+    metrics.record_probe(probe)
 
-        data['add_file_to_pending_tasks'] = True
-        shared_info['has_chapters'] = True
+    # Evaluates all rules in one pass and keeps the decision with the cached probe for the worker and post-processor
+    decision: rules.Decision = rules.evaluate(abspath, probe.get_result())
+    metrics.record_decision(decision)
+    if probe_cache is not None:
+        probe_cache.set_annotations(abspath, {'decision': decision.to_dict()})
 
-        return
+    # If file passes all checks, it's skipped
+    if not decision.needs_processing:
 
-    # Checks streams for subtitles, attachments and metadata
-    for stream in ffprobe_data['streams']:
-       
-        if stream['codec_type'] == 'subtitle':
-            
-            testing_subtitles_line: str = f'[TESTING] File {abspath} has subtitles, adding to queue'
-            logger_output(testing_subtitles_line)
-
-            data['add_file_to_pending_tasks'] = True
-            shared_info['has_subtitles'] = True
-            
-            return
-       
-        if stream['codec_type'] != 'audio' and stream['codec_type'] != 'video':
+        eventlog.log_event('test_skipped', path=abspath)
 
-            testing_attachment_line: str = f'[TESTING] File {abspath} has non-audio, non-subtitle stream, likely an attachment, adding to queue'
-            logger_output(testing_attachment_line)
+        data['add_file_to_pending_tasks'] = False
+        record_verdict(directory_index, abspath, 'skip', directory_key)
 
-            data['add_file_to_pending_tasks'] = True
-            shared_info['has_attachment'] = True
+        return
 
-            return
-        
-        if 'tags' in stream:
+    eventlog.log_event('test_queued', path=abspath, rules=decision.fired)
 
-            allowed_tags: list = ['language', 'DURATION', 'ENCODER']
-            if not set(stream['tags'].keys()).issubset(allowed_tags):
-            
-                testing_tags_line: str = f'[TESTING] File {abspath} has unwanted metadata, adding to queue'
-                logger_output(testing_tags_line)
+    data['add_file_to_pending_tasks'] = True
+    record_verdict(directory_index, abspath, 'queue', directory_key)
 
-                data['add_file_to_pending_tasks'] = True
-                shared_info['has_unwanted_metadata'] = True
+    # Orders the queue by the estimated work of each file
+    priority_order: str = settings.get_setting('priority_order')
+    if priority_order in ('shortest_first', 'longest_first'):
+        task_cost: float = cost.estimate_cost(probe, decision, single_pass=bool(settings.get_setting('single_pass_remux')),
+                                              encoder_profile=settings.get_setting('encoder_profile'))
+        priority_score: int = cost.get_priority_score(task_cost, priority_order)
+        data['priority_score'] = (data.get('priority_score') or 0) + priority_score
 
-                return
+        eventlog.log_event('test_priority', path=abspath, cost=task_cost, priority_score=priority_score)
 
-    # If file passes all checks, it's skipped    
-    testing_skip_line: str = f"[TESTING] File {abspath} doesn't need processing, skipping"
-    logger_output(testing_skip_line)
-    
-    data['add_file_to_pending_tasks'] = False
     return
-            
 
+
+@metrics.timed_runner('worker_process')
 def on_worker_process(data: dict) -> None:
     """
     Runner function - enables additional configured processing jobs during the worker stages of a task.
@@ -244,9 +493,11 @@ def on_worker_process(data: dict) -> None:
 
     # Get the path to the file
     abspath: str = data['original_file_path']
+    settings = Settings(library_id=data.get('library_id'))
+    metrics.configure(settings.get_profile_directory(), settings.get_setting('metrics_format'))
+    eventlog.configure(settings.get_setting('log_format'))
 
-    processing_line: str = f'[PROCESSING] Processing file {abspath}'
-    logger_output(processing_line)
+    eventlog.log_event('process_started', path=abspath)
 
     # Defines working variables
     path, basename = os.path.split(abspath)
@@ -254,116 +505,102 @@ def on_worker_process(data: dict) -> None:
     no_ext: str = os.path.splitext(basename)[0] 
     file_in: str = data['file_in']
     data['file_out'] = f'{path}/{no_ext}.cache.mkv'
-    file_out: str = data['file_out']
-    video_codec: str = 'copy'
 
     # Get file probe
-    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'])
+    # The probe and the file test decision are reused from the cache while the file is unchanged
+    probe_cache = get_probe_cache(settings)
+    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'], cache=probe_cache, profile='lean')
     if not probe:
         # File not able to be probed by ffprobe
         return
-    ffprobe_data: dict = probe.get_probe()
-
-    # Set the parser
-    parser = Parser(logger)
-    parser.set_probe(probe)
-    data['command_progress_parser'] = parser.parse_progress
-
-    # Tests if container is .mkv
-    # A second pass will be needed if this matches
-    if os.path.splitext(abspath)[1] != '.mkv':
-
-        processing_mkv_line: str = f'[PROCESSING] File {abspath} container is not .mkv, processing'
-        logger_output(processing_mkv_line)
-
-        data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-c', 'copy', f'{file_out}']
+    metrics.record_probe(probe)
+    decision: rules.Decision = get_task_decision(abspath, probe, probe_cache)
 
-        return
-        
-    # Checks the first video stream for x264
-    for stream in ffprobe_data['streams']:
-        
-        if stream['codec_type'] == 'video' and stream['codec_name'] != 'h264':
-
-            processing_x264_line: str = f'[PROCESSING] File {abspath} video stream is not x264, setting video codec'
-            logger_output(processing_x264_line)
-
-            video_codec: str = 'h264' # type: ignore
-            break
-            # This function doesn't return yet, as the file still needs to be checked for audio
-        
-    # Checks if the video stream is the first stream
-    if ffprobe_data['streams'][0]['codec_type'] != 'video':
-        
-        processing_video_0_line: str = f'[PROCESSING] File {abspath} does not have video as the first stream, processing'
-        logger_output(processing_video_0_line)
-        
-        for stream in ffprobe_data['streams']:
-            if stream['codec_type'] == 'video':
-                data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a', '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
-    
-    # Checks if first audio stream is ac3
-    if ffprobe_data['streams'][1]['codec_type'] == 'audio' and ffprobe_data['streams'][1]['codec_name'] != 'ac3':
-        
-        processing_ac3_line: str = f'[PROCESSING] File {abspath} does not have ac3 as the first audio stream, processing'
-        logger_output(processing_ac3_line)
+    if not decision.needs_processing:
 
-        data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a:0', '-c:a:0', 'ac3', '-map', '0:a:0', '-c:a:1', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
-    
-        
-        return
-    
-    # If video check matches, processing starts after checking audio
-    if video_codec == '-c:v:0 x264':
-        
-        data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a', '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
+        eventlog.log_event('process_skipped', path=abspath)
 
         return
 
-    # Checks if there are chapters
-    if ffprobe_data['chapters'] != []:
-
-        processing_chapters_line: str = f'[PROCESSING] File {abspath} has chapters, processing'
-        logger_output(processing_chapters_line)
+    # Files that are not .mkv get every change in one run, unless they also need a transcode
+    single_pass: bool = bool(settings.get_setting('single_pass_remux'))
+    remux_only: bool = decision.is_remux_only(single_pass)
+
+    # Long files can be split into segments that are encoded in parallel
+    transcode_video: bool = decision.has_fired('non_h264') and not remux_only
+    segment_count: int = 1
+    if transcode_video and settings.get_setting('segment_encoding'):
+        segment_count = segment.get_segment_count(probe.get_result().duration,
+                                                  int(settings.get_setting('segment_count')))
+
+    # Writes the cache file to the scratch directory if it has room for the expected output,
+    # and for the segment work directory next to it when the video is encoded in segments
+    scratch_directory: str = settings.get_setting('scratch_directory')
+    if scratch_directory:
+        expected_size: int = fileops.get_expected_output_size(probe.get_result(), decision)
+        if segment_count > 1:
+            expected_size += fileops.get_expected_segment_work_size(probe.get_result())
+        try:
+            os.makedirs(scratch_directory, exist_ok=True)
+            if not os.access(scratch_directory, os.W_OK | os.X_OK):
+                raise PermissionError(f'{scratch_directory} is not writable')
+        except OSError as e:
+            # Missing mounts, read-only filesystems and permission errors fall back to the default location
+            eventlog.log_event('scratch_unavailable', path=abspath, directory=scratch_directory, error=e)
+        else:
+            if fileops.has_free_space(scratch_directory, expected_size):
+                data['file_out'] = fileops.get_scratch_file_path(scratch_directory, abspath)
+            else:
+                eventlog.log_event('scratch_full', path=abspath, directory=scratch_directory,
+                                   expected_size=expected_size)
+    file_out: str = data['file_out']
 
-        data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a',  '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
+    eventlog.log_event('process_rules', path=abspath, rules=decision.fired)
 
+    # Set the parser
+    # With metrics enabled, the FFmpeg run time and throughput are recorded from the progress it reports
+    parser = Parser(logger)
+    parser.set_probe(probe)
+    data['command_progress_parser'] = parser.parse_progress
+    if settings.get_setting('metrics_format') in metrics.metrics_file_names:
+        progress_recorder = metrics.ProgressRecorder(parser, decision.get_work_type(single_pass),
+                                                     duration=probe.get_result().duration)
+        data['command_progress_parser'] = progress_recorder.parse_progress
+    if remux_only:
+
+        eventlog.log_event('process_remux_only', path=abspath)
+
+    # Budgets the encoder threads across the configured number of workers and the segments of each worker
+    video_encoder_args: list = []
+    if transcode_video:
+        video_encoder_args = encoder.get_x264_args(settings.get_setting('encoder_profile'),
+                                                   int(settings.get_setting('encoder_worker_count')) * segment_count)
+
+        eventlog.log_event('process_encoder', path=abspath, encoder_args=video_encoder_args)
+
+    progress_pipe: bool = bool(settings.get_setting('ffmpeg_progress_pipe'))
+    if segment_count > 1:
+
+        eventlog.log_event('process_segments', path=abspath, segment_count=segment_count)
+
+        # The segments are encoded by the segment script, FFmpeg only copies the joined video stream
+        video_file: str = segment.get_video_file(segment.get_work_directory(file_out))
+        mux_command: list = decision.get_ffmpeg_command(file_in, file_out, probe.get_result(),
+                                                        single_pass=single_pass, video_file=video_file)
+        data['exec_command'] = segment.get_segment_command(file_in, file_out, probe.get_result().duration,
+                                                           segment_count, video_encoder_args, mux_command,
+                                                           ProbeEnvironment.get().get_ffprobe_path())
         return
-    
-    # Checks streams for subtitles, attachments and metadata
-    for stream in ffprobe_data['streams']:
-       
-        if stream['codec_type'] == 'subtitle':
-            
-            processing_subtitles_line: str = f'[PROCESSING] File {abspath} has subtitles, processing'
-            logger_output(processing_subtitles_line)
-
-            data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a', '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
-            
-            return
-       
-        if stream['codec_type'] != 'audio' and stream['codec_type'] != 'video':
-
-            processing_attachment_line: str = f'[PROCESSING] File {abspath} has non-audio, non-subtitle stream, likely an attachment, processing'
-            logger_output(processing_attachment_line)
-
-            data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a', '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
 
-            return
-
-        allowed_tags = ['language', 'DURATION', 'ENCODER']
-        if not set(stream['tags'].keys()).issubset(allowed_tags):
-            
-            processing_tags_line: str = f'[PROCESSING] File {abspath} has unwanted metadata, processing'
-            logger_output(processing_tags_line)
-
-            data['exec_command'] = ['ffmpeg', '-y', '-i', f'{file_in}', '-map', '0:v:0', '-c:v:0', f'{video_codec}', '-map', '0:a', '-c:a', 'copy', '-sn', '-map_metadata', '-1', '-map_chapters', '-1', f'{file_out}']
-            
-            return
+    data['exec_command'] = decision.get_ffmpeg_command(file_in, file_out, probe.get_result(),
+                                                       progress_pipe=progress_pipe,
+                                                       video_encoder_args=video_encoder_args,
+                                                       single_pass=single_pass)
 
     return
 
 
+@metrics.timed_runner('postprocessor_file_movement')
 def on_postprocessor_file_movement(data: dict) -> None:
     """
     Runner function - configures additional postprocessor file movements during the postprocessor stage of a task.
@@ -382,53 +619,59 @@ def on_postprocessor_file_movement(data: dict) -> None:
     # Defines paths
     data['path'] = data['source_data']['abspath']
     abspath: str = data['path']
-    source_dirpath: str = f"{os.path.split(data['source_data']['abspath'])[0]}"
-    source_dirpath_replaced: str = source_dirpath.replace('\\', '/')
-    show_dir: str = source_dirpath_replaced.split('/')[-2]
     basename: str = data['source_data']['basename']
+    settings = Settings(library_id=data.get('library_id'))
+    metrics.configure(settings.get_profile_directory(), settings.get_setting('metrics_format'))
+    eventlog.configure(settings.get_setting('log_format'))
 
-
-    post_processing_metadata_line: str = f'[POST-PROCESSING] Post-processing file {abspath}'
-    logger_output(post_processing_metadata_line)
+    eventlog.log_event('postprocess_started', path=abspath)
 
     # Get file probe
-    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'])
+    # The probe and the file test decision are reused from the cache while the file is unchanged
+    probe_cache = get_probe_cache(settings)
+    probe = Probe.init_probe(data, logger, allowed_mimetypes=['video'], cache=probe_cache, profile='lean')
     if not probe:
         # File not able to be probed by ffprobe
         return
+    metrics.record_probe(probe)
+
+    decision: rules.Decision = get_task_decision(abspath, probe, probe_cache)
+    destination: dict = decision.get_destination(abspath, basename)
 
-    ffprobe_data: dict = probe.get_probe()
-   
     # Sets function parameters
-    data['remove_source_file'] = False
+    data['remove_source_file'] = destination['remove_source_file']
     data['copy_file'] = True
-    data['run_default_file_copy'] = False
-    data['file_out'] = f'{source_dirpath_replaced}/{basename}'
+    data['run_default_file_copy'] = destination['run_default_file_copy']
+    data['file_out'] = destination['file_out']
 
-    # Resets output location for files with a new container
-    if os.path.splitext(abspath)[1] != '.mkv':
+    # Sets Plex Optimized Versions as output folder for x264 transcodes
+    if decision.has_fired('non_h264'):
+        os.makedirs(destination['directory'], exist_ok= True)
 
-        post_processing_mkv_line: str = f'[POST-PROCESSING] File {abspath} container is now .mkv, moving'
-        logger_output(post_processing_mkv_line)
+    # Moves the file into place with a rename, reflink or in-kernel copy, instead of Unmanic's copy
+    if settings.get_setting('postprocessor_move_file') and not destination['run_default_file_copy'] and data.get('file_in'):
+        try:
+            move_start: float = time.perf_counter()
+            move_method: str = fileops.move_into_place(data['file_in'], destination['file_out'])
+            metrics.observe('move_seconds', time.perf_counter() - move_start, method=move_method)
+            data['copy_file'] = False
 
-        data['remove_source_file'] = True
-        data['run_default_file_copy'] = True
+            eventlog.log_event('postprocess_moved', file_in=data['file_in'], file_out=destination['file_out'],
+                               method=move_method)
 
-        return
+        except OSError as e:
+            eventlog.log_event('postprocess_failed', file_in=data['file_in'], file_out=destination['file_out'], error=e)
 
-    # Sets Plex Optimized Versions as output folder for x264 transcodes
-    for stream in ffprobe_data['streams']:
-        
-        if stream['codec_type'] == 'video' and stream['codec_name'] != 'h264':
+    # Resets output location for files with a new container
+    if decision.has_fired('container_is_not_mkv'):
 
-            post_processing_x264_line: str = f'[POST-PROCESSING] File {abspath} video stream is not x264, setting different output'
-            logger_output(post_processing_x264_line)
+        eventlog.log_event('postprocess_remux', path=abspath)
 
-            os.makedirs(f'{source_dirpath_replaced}/Plex Versions/Optimized for TV/{show_dir}', exist_ok= True)
+        return
 
-            data['file_out'] = f'{source_dirpath_replaced}/Plex Versions/Optimized for TV/{show_dir}/{basename}'
-            
-            break
+    # Sets Plex Optimized Versions as output folder for x264 transcodes
+    if decision.has_fired('non_h264'):
 
-    return
+        eventlog.log_event('postprocess_x264', path=abspath)
 
+    return
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.prefilter.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 12:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import logging
+import os
+import stat
+import threading
+
+from fabiorzfreitas_preset.lib.ffmpeg import Probe
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+
+# Pre-filter stages, run before ffprobe is spawned
+# Each stage returns the reason a file is rejected, or an empty string if it passes
+def test_cache_file(abspath: str) -> str:
+    """
+    Skips cache files, and the files in the segment work directory of a cache file
+    """
+
+    basename_split: list = os.path.basename(abspath).split('.')
+    if len(basename_split) > 1 and basename_split[-2] == 'cache':
+        return 'is cache'
+
+    dirname_split: list = os.path.basename(os.path.dirname(abspath)).split('.')
+    if len(dirname_split) > 1 and dirname_split[-2:] == ['cache', 'segments']:
+        return 'is in a segment work directory'
+
+    return ''
+
+
+def test_part_file(abspath: str) -> str:
+    """
+    Skips .part files
+    """
+
+    if os.path.splitext(abspath)[1] == '.part':
+        return 'extension is .part'
+
+    return ''
+
+
+def test_extension(abspath: str) -> str:
+    """
+    Skips files without an extension, as their MIME type can't be guessed
+    """
+
+    if not os.path.splitext(abspath)[1]:
+        return 'has no extension'
+
+    return ''
+
+
+def test_mimetype(abspath: str) -> str:
+    """
+    Skips files that are not video files
+    """
+
+    if not Probe(logger, allowed_mimetypes=['video']).test_valid_mimetype(abspath):
+        return 'is not a video file'
+
+    return ''
+
+
+def test_already_optimized(abspath: str) -> str:
+    """
+    Tests if file is already in Optimized folder, or if an optimized version of it exists
+    """
+
+    source_dirpath: str = f"{os.path.split(abspath)[0]}"
+    source_dirpath_replaced: str = source_dirpath.replace('\\', '/')
+    show_dir: str = source_dirpath_replaced.split('/')[-2]
+    basename: str = f"{os.path.split(abspath)[1]}"
+
+    if show_dir == 'Optimized for TV' or os.path.exists(f'{source_dirpath_replaced}/Plex Versions/Optimized for TV/{show_dir}/{basename}'):
+        return 'already has been optimized'
+
+    return ''
+
+
+def test_stat(abspath: str) -> str:
+    """
+    Skips files that don't exist, are not regular files or are empty
+    """
+
+    try:
+        file_stat = os.stat(abspath)
+    except OSError:
+        return 'does not exist'
+
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+        return 'is empty or not a regular file'
+
+    return ''
+
+
+# The name based stages come first, they don't touch the filesystem. The last two cost one syscall each.
+# already_optimized runs before stat so that it still marks optimized files as not needing processing.
+# The last value sets whether a rejected file is explicitly marked as not needing processing,
+# files that can't be probed are left for other plugins to decide on, as before
+stages: list = [
+    ('cache_file', test_cache_file, True),
+    ('part_file', test_part_file, True),
+    ('extension', test_extension, False),
+    ('mimetype', test_mimetype, False),
+    ('already_optimized', test_already_optimized, True),
+    ('stat', test_stat, False),
+]
+
+# Stages whose verdict also depends on other files than the one tested, so it can't be kept in the directory index.
+# Deleting the optimized copy of a file changes neither the file nor its directory.
+external_stages: tuple = ('already_optimized',)
+
+# Number of files rejected by each stage, plus the files that passed all of them
+counters: dict = {name: 0 for name, _, _ in stages}
+counters['passed'] = 0
+counters_lock = threading.Lock()
+
+
+def run(abspath: str, count: bool = True):
+    """
+    Runs the pre-filter stages in order and returns the first stage that rejected the file,
+    as a (stage_name, reason, skip_file) tuple, or None if the file should be probed
+    """
+
+    for stage_name, stage, skip_file in stages:
+        reason: str = stage(abspath)
+        if reason:
+            if count:
+                with counters_lock:
+                    counters[stage_name] += 1
+            return stage_name, reason, skip_file
+
+    if count:
+        with counters_lock:
+            counters['passed'] += 1
+
+    return None
+
+
+def get_counters() -> dict:
+    """
+    Returns a copy of the pre-filter counters
+    """
+
+    with counters_lock:
+        return dict(counters)
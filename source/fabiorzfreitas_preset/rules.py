@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.rules.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 11:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import os
+
+from fabiorzfreitas_preset.lib.ffmpeg import ProbeResult
+from fabiorzfreitas_preset.mapper import PresetStreamMapper
+
+# Tags that are kept on streams, any other tag is unwanted metadata
+allowed_tags: frozenset = frozenset(['language', 'DURATION', 'ENCODER'])
+
+
+# Rule tests
+# Each test receives the file path and its probe, and returns True if the rule fires
+def test_container_is_not_mkv(abspath: str, probe_result: ProbeResult) -> bool:
+    return os.path.splitext(abspath)[1] != '.mkv'
+
+
+def test_non_h264(abspath: str, probe_result: ProbeResult) -> bool:
+    return bool(probe_result.codec_names_of_type('video') - {'h264'})
+
+
+def test_non_0_video_stream(abspath: str, probe_result: ProbeResult) -> bool:
+    first_video = probe_result.first_video
+    return first_video is not None and probe_result.streams[0] is not first_video
+
+
+def test_first_audio_is_not_ac3(abspath: str, probe_result: ProbeResult) -> bool:
+    first_audio = probe_result.first_audio
+    return first_audio is not None and first_audio.codec_name != 'ac3'
+
+
+def test_has_chapters(abspath: str, probe_result: ProbeResult) -> bool:
+    return probe_result.chapter_count > 0
+
+
+def test_has_subtitles(abspath: str, probe_result: ProbeResult) -> bool:
+    return probe_result.has_codec_type('subtitle')
+
+
+def test_has_attachment(abspath: str, probe_result: ProbeResult) -> bool:
+    return any(codec_type not in ('audio', 'video', 'subtitle') for codec_type in probe_result.stream_positions)
+
+
+def test_has_unwanted_metadata(abspath: str, probe_result: ProbeResult) -> bool:
+    return not probe_result.tag_keys <= allowed_tags
+
+
+# The preset rules, as (name, description, test) tuples
+# All rules are evaluated in a single pass and the order only sets the order they are reported in
+rules: list = [
+    ('container_is_not_mkv', 'container is not .mkv', test_container_is_not_mkv),
+    ('non_h264', 'video stream is not x264', test_non_h264),
+    ('non_0_video_stream', 'does not have video as the first stream', test_non_0_video_stream),
+    ('first_audio_is_not_ac3', 'does not have ac3 as the first audio stream', test_first_audio_is_not_ac3),
+    ('has_chapters', 'has chapters', test_has_chapters),
+    ('has_subtitles', 'has subtitles', test_has_subtitles),
+    ('has_attachment', 'has non-audio, non-subtitle stream, likely an attachment', test_has_attachment),
+    ('has_unwanted_metadata', 'has unwanted metadata', test_has_unwanted_metadata),
+]
+
+rule_descriptions: dict = {name: description for name, description, _ in rules}
+
+
+class Decision(object):
+    """
+    The result of evaluating the preset rules against a file.
+
+    Holds the names of the rules that fired. The FFmpeg command and the output destination are both derived from them,
+    so a decision can be stored (see to_dict/from_dict) and reused by the worker and post-processor.
+    """
+
+    __slots__ = ('fired',)
+
+    def __init__(self, fired=()):
+        self.fired: tuple = tuple(fired)
+
+    def __repr__(self):
+        return f'Decision(fired={self.fired})'
+
+    @property
+    def needs_processing(self) -> bool:
+        return bool(self.fired)
+
+    def has_fired(self, rule_name: str) -> bool:
+        return rule_name in self.fired
+
+    def get_descriptions(self) -> list:
+        """
+        Returns the descriptions of the rules that fired, in rule order
+        """
+
+        return [rule_descriptions.get(rule_name, rule_name) for rule_name in self.fired]
+
+    def is_single_pass(self) -> bool:
+        """
+        Returns True if every rule can be applied in one FFmpeg run.
+        Files that are not .mkv and also need an x264 transcode are only remuxed first, because the transcode is
+        written to a different destination. The remuxed file is then picked up again by the next library scan.
+        """
+
+        return not (self.has_fired('container_is_not_mkv') and self.has_fired('non_h264'))
+
+    def is_remux_only(self, single_pass: bool = True) -> bool:
+        """
+        Returns True if the file will only be remuxed to .mkv in this pass, leaving the remaining rules for a second pass
+        """
+
+        return self.has_fired('container_is_not_mkv') and not (single_pass and self.is_single_pass())
+
+    def get_work_type(self, single_pass: bool = True) -> str:
+        """
+        Returns the most expensive kind of work FFmpeg does for this decision: 'video_transcode', 'audio_transcode'
+        or 'remux' when every stream is copied
+        """
+
+        if self.is_remux_only(single_pass):
+            return 'remux'
+        if self.has_fired('non_h264'):
+            return 'video_transcode'
+        if self.has_fired('first_audio_is_not_ac3'):
+            return 'audio_transcode'
+
+        return 'remux'
+
+    def get_ffmpeg_command(self, file_in: str, file_out: str, probe_result: ProbeResult,
+                           progress_pipe: bool = False, video_encoder_args: list = None,
+                           single_pass: bool = True, video_file: str = None) -> list:
+        """
+        Returns the FFmpeg command for this decision, or an empty list if the file doesn't need processing.
+        The stream mapping is built from the probe by the PresetStreamMapper, so untouched streams are copied and
+        unwanted streams are left out with their -map.
+        With progress_pipe, FFmpeg writes machine-readable progress blocks to stdout instead of the stats line.
+        The video_encoder_args are added after the video codec when the video is encoded with libx264.
+        Without single_pass, files that are not .mkv are always only remuxed and the remaining rules are left
+        for a second pass.
+        With a video_file, the video stream is copied from that file instead of being encoded from file_in.
+        """
+
+        if not self.fired:
+            return []
+
+        # Files that are not .mkv are remuxed with every other rule applied in the same run when possible
+        # Otherwise they are only remuxed and a second pass will be needed to apply the remaining rules
+        if self.is_remux_only(single_pass):
+            command: list = ['ffmpeg', '-y']
+            if progress_pipe:
+                command += ['-progress', 'pipe:1', '-nostats']
+            return command + ['-i', f'{file_in}', '-c', 'copy', f'{file_out}']
+
+        mapper = PresetStreamMapper(transcode_video=self.has_fired('non_h264'),
+                                    prepend_ac3=self.has_fired('first_audio_is_not_ac3'),
+                                    video_encoder_args=video_encoder_args,
+                                    video_input_file=video_file)
+        mapper.set_probe_result(probe_result)
+        mapper.set_progress_pipe(progress_pipe)
+        mapper.set_input_file(file_in)
+        mapper.set_output_file(file_out)
+        mapper.streams_need_processing()
+
+        return ['ffmpeg'] + mapper.get_ffmpeg_args()
+
+    def get_destination(self, source_abspath: str, basename: str) -> dict:
+        """
+        Returns where the post-processor should move the processed file, as a dictionary of:
+            file_out                - The destination file.
+            directory               - The destination directory, which may need to be created.
+            remove_source_file      - Boolean, should the source file be removed.
+            run_default_file_copy   - Boolean, should Unmanic run its default file copy.
+        """
+
+        source_dirpath: str = f'{os.path.split(source_abspath)[0]}'
+        source_dirpath_replaced: str = source_dirpath.replace('\\', '/')
+        show_dir: str = source_dirpath_replaced.split('/')[-2]
+
+        destination: dict = {
+            'file_out':              f'{source_dirpath_replaced}/{basename}',
+            'directory':             source_dirpath_replaced,
+            'remove_source_file':    False,
+            'run_default_file_copy': False,
+        }
+
+        # Resets output location for files with a new container
+        if self.has_fired('container_is_not_mkv'):
+            destination['remove_source_file'] = True
+            destination['run_default_file_copy'] = True
+            return destination
+
+        # Sets Plex Optimized Versions as output folder for x264 transcodes
+        if self.has_fired('non_h264'):
+            optimized_dirpath: str = f'{source_dirpath_replaced}/Plex Versions/Optimized for TV/{show_dir}'
+            destination['file_out'] = f'{optimized_dirpath}/{basename}'
+            destination['directory'] = optimized_dirpath
+
+        return destination
+
+    def to_dict(self) -> dict:
+        return {'fired': list(self.fired)}
+
+    @classmethod
+    def from_dict(cls, decision_dict: dict):
+        fired: list = [rule_name for rule_name in decision_dict.get('fired', []) if rule_name in rule_descriptions]
+        return cls(fired)
+
+
+def evaluate(abspath: str, probe_result: ProbeResult) -> Decision:
+    """
+    Evaluates every rule against the file probe in a single pass and returns the decision
+    """
+
+    return Decision(rule_name for rule_name, _, test in rules if test(abspath, probe_result))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.scan.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 12:30
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+"""
+    Offline library scanner.
+
+    Walks a directory tree and applies the preset's file test to every file, without a running Unmanic server.
+    A JSON line is written for every file with whether it would be queued and why, followed by a summary on stderr.
+
+    Run it from the directory that contains the plugin:
+        python -m fabiorzfreitas_preset.scan /path/to/library --workers 8 --output report.jsonl
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from fabiorzfreitas_preset import prefilter, rules
+from fabiorzfreitas_preset.lib.ffmpeg import Probe, ProbeCache, ProbeEnvironment
+
+logger = logging.getLogger("Unmanic.Plugin.fabiorzfreitas_preset")
+
+# Settings for the file test in each worker process, set by init_worker()
+worker_options: dict = {}
+
+
+def walk_files(root: str):
+    """
+    Yields the path of every file under the given root, using os.scandir
+    """
+
+    pending_dirs: list = [root]
+    while pending_dirs:
+        directory: str = pending_dirs.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending_dirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+        except OSError as e:
+            logger.warning(f'Unable to read directory {directory}: {e}')
+
+
+def init_worker(options: dict) -> None:
+    """
+    Stores the scan options in each worker process
+    """
+
+    worker_options.update(options)
+
+
+def scan_file(abspath: str) -> dict:
+    """
+    Runs the file test logic against a single file and returns a report entry
+    """
+
+    start: float = time.perf_counter()
+    report: dict = {
+        'path':   abspath,
+        'queued': False,
+        'stage':  'prefilter',
+        'reasons': [],
+        'rules':  [],
+        'prefilter': None,
+    }
+
+    # Runs the pre-filter stages before spawning ffprobe
+    prefilter_result = prefilter.run(abspath, count=False)
+    if prefilter_result:
+        stage_name, reason, _ = prefilter_result
+        report['prefilter'] = stage_name
+        report['reasons'] = [reason]
+        report['elapsed'] = round(time.perf_counter() - start, 6)
+        return report
+
+    # Gets file probe
+    cache = None
+    if worker_options.get('cache_path'):
+        cache = ProbeCache.open(worker_options['cache_path'])
+    probe = Probe(logger, allowed_mimetypes=['video'], cache=cache, profile=worker_options.get('profile', 'lean'))
+    if not probe.file(abspath):
+        report['stage'] = 'probe'
+        report['reasons'] = ['unable to be probed by ffprobe']
+        report['elapsed'] = round(time.perf_counter() - start, 6)
+        return report
+
+    # Evaluates all rules in one pass
+    decision: rules.Decision = rules.evaluate(abspath, probe.get_result())
+    if cache is not None:
+        cache.set_annotations(abspath, {'decision': decision.to_dict()})
+
+    report['stage'] = 'rules'
+    report['queued'] = decision.needs_processing
+    report['rules'] = list(decision.fired)
+    report['reasons'] = decision.get_descriptions()
+    report['elapsed'] = round(time.perf_counter() - start, 6)
+
+    return report
+
+
+def scan_files(paths: list) -> list:
+    """
+    Runs scan_file() against a chunk of files in a worker process
+    """
+
+    return [scan_file(abspath) for abspath in paths]
+
+
+def iter_chunks(iterable, size: int):
+    chunk: list = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_library(executor, root: str, chunksize: int, max_pending: int):
+    """
+    Yields a report entry for every file under the given root as the worker processes finish them.
+    At most max_pending chunks are submitted at a time, so the tree is walked as the scan goes on and memory use
+    doesn't grow with the size of the library.
+    """
+
+    pending = set()
+    for chunk in iter_chunks(walk_files(root), chunksize):
+        pending.add(executor.submit(scan_files, chunk))
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m fabiorzfreitas_preset.scan',
+        description='Evaluate the fabiorzfreitas preset against a library and report which files would be queued.',
+    )
+    parser.add_argument('root', help='Root directory of the library to scan')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default: number of CPUs)')
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help='Number of files sent to a worker process at a time (default: 16)')
+    parser.add_argument('--output', default='-',
+                        help='File to write the JSON lines report to (default: stdout)')
+    parser.add_argument('--cache', dest='cache_path', default=None,
+                        help='Path of a probe cache database to read from and update')
+    parser.add_argument('--profile', default='lean', choices=['lean', 'full'],
+                        help="FFprobe profile to use (default: 'lean')")
+    parser.add_argument('--verbose', action='store_true', help='Log debug messages to stderr')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr)
+
+    if ProbeEnvironment.get().get_ffprobe_path() is None:
+        print("Unable to find executable 'ffprobe'. Please ensure that FFmpeg is installed correctly.", file=sys.stderr)
+        return 1
+    if not os.path.isdir(args.root):
+        print(f'Library root {args.root} is not a directory', file=sys.stderr)
+        return 1
+
+    options: dict = {
+        'cache_path': os.path.abspath(args.cache_path) if args.cache_path else None,
+        'profile':    args.profile,
+    }
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    counts: dict = {'files': 0, 'queued': 0}
+    rule_counts: dict = {}
+    prefilter_counts: dict = {}
+    start: float = time.perf_counter()
+    try:
+        workers: int = max(1, args.workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(options,)) as executor:
+            for report in scan_library(executor, os.path.abspath(args.root), max(1, args.chunksize), workers * 2):
+                output.write(json.dumps(report) + '\n')
+                counts['files'] += 1
+                if report['queued']:
+                    counts['queued'] += 1
+                for rule_name in report['rules']:
+                    rule_counts[rule_name] = rule_counts.get(rule_name, 0) + 1
+                if report['prefilter']:
+                    prefilter_counts[report['prefilter']] = prefilter_counts.get(report['prefilter'], 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed: float = time.perf_counter() - start
+    summary: dict = {
+        'files':          counts['files'],
+        'queued':         counts['queued'],
+        'rules':          rule_counts,
+        'prefilter':      prefilter_counts,
+        'elapsed':        round(elapsed, 3),
+        'files_per_second': round(counts['files'] / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(json.dumps(summary), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+    fabiorzfreitas_preset.segment.py
+ 
+    Written by:               Fabiorzfreitas <mckfabio@gmail.com>
+    Date:                     Sunday, October 18th, 2026, 17:00
+ 
+    Copyright:
+           Copyright (C) Josh Sunnex - All Rights Reserved
+ 
+           Permission is hereby granted, free of charge, to any person obtaining a copy
+           of this software and associated documentation files (the "Software"), to deal
+           in the Software without restriction, including without limitation the rights
+           to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+           copies of the Software, and to permit persons to whom the Software is
+           furnished to do so, subject to the following conditions:
+  
+           The above copyright notice and this permission notice shall be included in all
+           copies or substantial portions of the Software.
+  
+           THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND,
+           EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+           MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+           IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+           DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+           OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+           OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+import ctypes
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+# Shortest segment worth encoding on its own, shorter files are encoded in a single FFmpeg run
+min_segment_seconds: int = 60
+
+# Seconds between the aggregated progress blocks written to stdout
+progress_interval: float = 0.5
+
+ffmpeg_base_args: list = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+
+# Video start offsets shorter than this (in seconds) are not applied again when muxing
+min_start_offset: float = 0.0005
+
+# prctl() option that sends a signal to a process when its parent exits
+PR_SET_PDEATHSIG: int = 1
+
+
+def get_segment_count(duration: float, max_segments: int) -> int:
+    """
+    Returns the number of segments a video of the given duration is split into, or 1 if it is too short to split
+    """
+
+    if not duration or duration <= 0:
+        return 1
+
+    return max(1, min(int(max_segments), int(duration // min_segment_seconds)))
+
+
+def get_work_directory(file_out: str) -> str:
+    """
+    Returns the directory holding the segments of an encode, next to the output file
+    """
+
+    return f'{os.path.splitext(file_out)[0]}.segments'
+
+
+def get_video_file(work_directory: str) -> str:
+    """
+    Returns the file the encoded segments are joined into
+    """
+
+    return os.path.join(work_directory, 'video.mkv')
+
+
+def get_segment_command(file_in: str, file_out: str, duration: float, segment_count: int, video_encoder_args: list,
+                        mux_command: list, ffprobe_path: str) -> list:
+    """
+    Returns the command that runs this module as a script to encode the video stream of file_in in segments.
+    The mux_command must copy the joined video stream from get_video_file() into file_out.
+    """
+
+    job: dict = {
+        'file_in':            file_in,
+        'ffprobe_path':       ffprobe_path,
+        'duration':           duration,
+        'segment_count':      segment_count,
+        'video_encoder_args': video_encoder_args,
+        'mux_command':        mux_command,
+        'work_directory':     get_work_directory(file_out),
+    }
+
+    return [sys.executable, os.path.abspath(__file__), json.dumps(job)]
+
+
+def get_keyframe_times_command(ffprobe_path: str, file_in: str) -> list:
+    """
+    Returns the ffprobe command that lists the packets of the first video stream, the video isn't decoded
+    """
+
+    return [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0', file_in]
+
+
+def parse_keyframe_times(output: str) -> list:
+    """
+    Returns the sorted timestamps (as written by ffprobe) of the keyframes in the output of the keyframe times command
+    """
+
+    keyframe_times: list = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' not in flags:
+            continue
+        try:
+            keyframe_times.append((float(pts_time), pts_time))
+        except ValueError:
+            continue
+    keyframe_times.sort()
+
+    return [pts_time for _, pts_time in keyframe_times]
+
+
+def get_start_offset_command(ffprobe_path: str, file_in: str) -> list:
+    """
+    Returns the ffprobe command that reads the start time of the file and of its first video stream
+    """
+
+    return [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+            'stream=start_time:format=start_time', '-of', 'json', file_in]
+
+
+def parse_start_offset(output: str) -> float:
+    """
+    Returns how many seconds after the start of the file its first video stream starts, from the output of the start
+    offset command
+    """
+
+    try:
+        probe: dict = json.loads(output)
+        video_start: float = float(probe['streams'][0]['start_time'])
+        file_start: float = float(probe['format']['start_time'])
+    except (ValueError, KeyError, IndexError, TypeError):
+        return 0.0
+
+    return max(0.0, video_start - file_start)
+
+
+def get_offset_mux_command(mux_command: list, video_file: str, start_offset: float) -> list:
+    """
+    Returns the mux command with the video_file input delayed by start_offset seconds.
+    The joined segments always start at 0, this restores the gap between the start of the source file and the start of
+    its video stream, so the video stays in sync with the streams copied from the source file.
+    """
+
+    if start_offset < min_start_offset:
+        return mux_command
+
+    for position in range(len(mux_command) - 1):
+        if mux_command[position] == '-i' and mux_command[position + 1] == video_file:
+            return mux_command[:position] + ['-itsoffset', f'{start_offset:.6f}'] + mux_command[position:]
+
+    return mux_command
+
+
+def get_parent_death_signal_setter():
+    """
+    Returns a function that makes the calling process receive SIGKILL when its parent exits, or None if the platform
+    doesn't support it. It is run in each FFmpeg process before it starts, so none of them outlive a killed script.
+    """
+
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        prctl = ctypes.CDLL(None, use_errno=True).prctl
+    except (OSError, AttributeError):
+        return None
+
+    def set_parent_death_signal():
+        prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+
+    return set_parent_death_signal
+
+
+def get_split_times(keyframe_times: list, duration: float, segment_count: int) -> list:
+    """
+    Returns the keyframe timestamps the video is split at, so that it is cut into segment_count segments of about
+    the same duration. Fewer split times are returned when there are not enough keyframes.
+    """
+
+    times: list = [float(pts_time) for pts_time in keyframe_times]
+    split_times: list = []
+    for segment in range(1, segment_count):
+        position: int = bisect_left(times, duration * segment / segment_count)
+        if position >= len(times):
+            break
+        pts_time: str = keyframe_times[position]
+        if times[position] > 0 and pts_time not in split_times:
+            split_times.append(pts_time)
+
+    return split_times
+
+
+class SegmentEncoder(object):
+    """
+    Encodes the video stream of a file in segments with one FFmpeg process per segment.
+
+    The video stream is copied into segments cut at keyframes, the segments are encoded at the same time and then
+    joined with the concat demuxer without encoding them again. Finally the mux command copies the joined video
+    stream and adds the other streams from the source file.
+    Progress is written to stdout in the same format as 'ffmpeg -progress pipe:1', with the output time and frame
+    count added up across the segments, so it can be read by the Parser class.
+
+    Every child process is started from the main thread in its own process group, which stop() kills. On Linux the
+    children are also killed by the kernel if this script exits without running stop(), e.g. on SIGKILL.
+    """
+
+    def __init__(self, job: dict):
+        self.file_in: str = job['file_in']
+        self.ffprobe_path: str = job.get('ffprobe_path') or 'ffprobe'
+        self.duration: float = float(job.get('duration') or 0)
+        self.segment_count: int = max(1, int(job['segment_count']))
+        self.video_encoder_args: list = job['video_encoder_args']
+        self.mux_command: list = job['mux_command']
+        self.work_directory: str = job['work_directory']
+
+        self.processes: list = []
+        self.processes_lock = threading.Lock()
+        self.segment_progress: dict = {}
+        self.stopped: bool = False
+        self.stop_signal: int = 0
+        self.set_parent_death_signal = get_parent_death_signal_setter()
+
+    def run(self) -> int:
+        """
+        Runs every step and returns the exit code of the first one that failed, or 0
+        """
+
+        os.makedirs(self.work_directory, exist_ok=True)
+        try:
+            returncode: int = self.split()
+            if returncode == 0:
+                returncode = self.encode_segments()
+            if returncode == 0:
+                returncode = self.join_segments()
+            if returncode == 0:
+                self.write_progress('continue')
+                returncode = self.run_command(self.get_mux_command())
+            if returncode == 0:
+                self.write_progress('end')
+            return returncode
+        finally:
+            self.stop()
+            shutil.rmtree(self.work_directory, ignore_errors=True)
+
+    def split(self) -> int:
+        """
+        Copies the video stream into segments cut at keyframes
+        """
+
+        keyframe_times: list = parse_keyframe_times(
+            self.read_command_output(get_keyframe_times_command(self.ffprobe_path, self.file_in)))
+        split_times: list = get_split_times(keyframe_times, self.duration, self.segment_count)
+        command: list = ffmpeg_base_args + ['-i', self.file_in, '-map', '0:v:0', '-c', 'copy', '-f', 'segment',
+                                            '-reset_timestamps', '1']
+        if split_times:
+            command += ['-segment_times', ','.join(split_times)]
+
+        return self.run_command(command + [os.path.join(self.work_directory, 'source_%03d.mkv')])
+
+    def get_segment_files(self, prefix: str) -> list:
+        return sorted(os.path.join(self.work_directory, name) for name in os.listdir(self.work_directory)
+                      if name.startswith(prefix))
+
+    def encode_segments(self) -> int:
+        """
+        Encodes every segment at the same time and returns once they have all finished, or as soon as one fails
+        """
+
+        source_files: list = self.get_segment_files('source_')
+        if not source_files:
+            sys.stderr.write(f'Splitting {self.file_in} produced no segments to encode\n')
+            return 1
+
+        executor = ThreadPoolExecutor(max_workers=len(source_files))
+        try:
+            # The processes are started here so that their parent is the main thread, the threads only read progress
+            futures: list = []
+            for segment, source_file in enumerate(source_files):
+                process = self.start_process(self.get_encode_command(segment, source_file), stdout=subprocess.PIPE)
+                if process is None:
+                    return 1
+                futures.append(executor.submit(self.read_segment_progress, segment, process))
+            while True:
+                self.write_progress('continue')
+                failed: list = [future.result() for future in futures if future.done() and future.result() != 0]
+                if failed:
+                    self.stop()
+                    return failed[0]
+                if all(future.done() for future in futures):
+                    return 0
+                time.sleep(progress_interval)
+                self.check_stop_signal()
+        except BaseException:
+            # The threads only finish once their FFmpeg process has exited
+            self.stop()
+            raise
+        finally:
+            executor.shutdown()
+
+    def get_encode_command(self, segment: int, source_file: str) -> list:
+        encoded_file: str = os.path.join(self.work_directory, f'encoded_{segment:03d}.mkv')
+        return ffmpeg_base_args + ['-progress', 'pipe:1', '-nostats', '-i', source_file, '-map', '0:v:0',
+                                   '-c:v:0', 'libx264'] + self.video_encoder_args + [encoded_file]
+
+    def read_segment_progress(self, segment: int, process) -> int:
+        progress: dict = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key in ('out_time_us', 'frame') and value.isdigit():
+                progress[key] = int(value)
+            elif key == 'progress':
+                self.segment_progress[segment] = dict(progress)
+
+        return process.wait()
+
+    def join_segments(self) -> int:
+        """
+        Joins the encoded segments with the concat demuxer, copying the video stream
+        """
+
+        list_file: str = os.path.join(self.work_directory, 'segments.txt')
+        with open(list_file, 'w') as f:
+            for encoded_file in self.get_segment_files('encoded_'):
+                escaped_file: str = encoded_file.replace("'", "'\\''")
+                f.write(f"file '{escaped_file}'\n")
+
+        command: list = ffmpeg_base_args + ['-f', 'concat', '-safe', '0', '-i', list_file, '-map', '0:v:0', '-c',
+                                            'copy', get_video_file(self.work_directory)]
+
+        return self.run_command(command)
+
+    def get_mux_command(self) -> list:
+        """
+        Returns the mux command, with the video start offset of the source file applied to the joined video stream
+        """
+
+        start_offset: float = parse_start_offset(
+            self.read_command_output(get_start_offset_command(self.ffprobe_path, self.file_in)))
+
+        return get_offset_mux_command(self.mux_command, get_video_file(self.work_directory), start_offset)
+
+    def write_progress(self, state: str):
+        segment_progress: list = list(self.segment_progress.values())
+        out_time_us: int = sum(progress.get('out_time_us', 0) for progress in segment_progress)
+        frame: int = sum(progress.get('frame', 0) for progress in segment_progress)
+
+        sys.stdout.write(f'frame={frame}\nout_time_us={out_time_us}\nprogress={state}\n')
+        sys.stdout.flush()
+
+    def start_process(self, command: list, stdout=None):
+        popen_options: dict = {}
+        if os.name == 'posix':
+            # A new session is also a new process group, so stop() can kill the process along with its children
+            popen_options['start_new_session'] = True
+            popen_options['preexec_fn'] = self.set_parent_death_signal
+
+        with self.processes_lock:
+            if self.stopped:
+                return None
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=stdout, universal_newlines=True,
+                                       **popen_options)
+            self.processes.append(process)
+        return process
+
+    def wait_process(self, process) -> int:
+        while True:
+            try:
+                return process.wait(timeout=progress_interval)
+            except subprocess.TimeoutExpired:
+                self.check_stop_signal()
+
+    def run_command(self, command: list) -> int:
+        process = self.start_process(command, stdout=subprocess.DEVNULL)
+        if process is None:
+            return 1
+        return self.wait_process(process)
+
+    def read_command_output(self, command: list) -> str:
+        """
+        Runs a command and returns its output, raising CalledProcessError if it fails
+        """
+
+        process = self.start_process(command, stdout=subprocess.PIPE)
+        if process is None:
+            raise subprocess.CalledProcessError(1, command)
+        while True:
+            try:
+                output, _ = process.communicate(timeout=progress_interval)
+                break
+            except subprocess.TimeoutExpired:
+                self.check_stop_signal()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+        return output
+
+    def request_stop(self, signum, frame):
+        """
+        Signal handler. It only records the signal, as taking the processes lock here would deadlock if the signal
+        arrived while the main thread held it. The main thread checks for it while it waits and unwinds through run().
+        """
+
+        self.stop_signal = signum
+
+    def check_stop_signal(self):
+        if self.stop_signal:
+            raise SystemExit(128 + self.stop_signal)
+
+    def stop(self):
+        """
+        Kills any FFmpeg process that is still running, along with its process group
+        """
+
+        with self.processes_lock:
+            self.stopped = True
+            for process in self.processes:
+                if process.poll() is None:
+                    try:
+                        if os.name == 'posix':
+                            os.killpg(process.pid, signal.SIGKILL)
+                        else:
+                            process.kill()
+                    except ProcessLookupError:
+                        pass
+                    process.wait()
+
+
+def main(argv: list) -> int:
+    segment_encoder = SegmentEncoder(json.loads(argv[0]))
+    signal.signal(signal.SIGTERM, segment_encoder.request_stop)
+    signal.signal(signal.SIGINT, segment_encoder.request_stop)
+
+    return segment_encoder.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))